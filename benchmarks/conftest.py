@@ -0,0 +1,31 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from benchmarks.synthetic import THROUGHPUTS, write_bugreport
+
+
+@pytest.fixture(scope="session")
+def bugreport_factory(tmp_path_factory) -> Callable[[int], Path]:
+    """
+    Get the synthetic bugreport of a size in MB, written once per session.
+    """
+    root = tmp_path_factory.mktemp("bugreports")
+    reports: dict[int, Path] = {}
+
+    def get(size_mb: int) -> Path:
+        if size_mb not in reports:
+            reports[size_mb] = write_bugreport(path=root / f"bugreport-fuxi-{size_mb}mb.txt", size_mb=size_mb)
+
+        return reports[size_mb]
+
+    return get
+
+
+def pytest_terminal_summary(terminalreporter) -> None:
+    if THROUGHPUTS:
+        terminalreporter.section("throughput (MB/s)")
+        width = max(len(name) for name in THROUGHPUTS)
+        for name, throughput in THROUGHPUTS.items():
+            terminalreporter.write_line(f"{name:<{width}}  {throughput:>10,.1f}")
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+# Sizes of the synthetic bugreports, in MB.
+REPORT_SIZES = [10, 100, 500]
+
+# Throughput of every finished benchmark: test id -> MB/s, printed at the end of the session.
+THROUGHPUTS: dict[str, float] = {}
+
+FILLER_LINE = b"01-01 12:00:00.000  1000  1234  1234 I ActivityManager: filler line with 4500 mAh and cycle count: x\n"
+
+
+def write_bugreport(path: str | Path, size_mb: int, index: int = 0) -> Path:
+    """
+    Write a synthetic bugreport of about `size_mb` MB, laid out like a real one: the fields the parser needs are
+    spread over the header, the batterystats dump about two thirds in and the health dump at the end,
+    with log noise everywhere else.
+
+    Parameters
+    ----------
+    path: str or Path
+        Path of the txt file.
+    size_mb: int
+        Approximate size of the file in MB.
+    index: int
+        Varies the capture time and capacities, so reports of the same size differ.
+
+    Returns
+    -------
+    Path
+        The path of the written file.
+    """
+    path = Path(path)
+    filler_lines = size_mb * 1024 * 1024 // len(FILLER_LINE)
+    block = FILLER_LINE * 1024
+
+    def write_filler(f, lines: int) -> None:
+        for _ in range(lines // 1024):
+            f.write(block)
+        f.write(FILLER_LINE * (lines % 1024))
+
+    with open(path, mode="wb") as f:
+        f.write(
+            b"========================================================\n"
+            + f"== dumpstate: 2024-01-{1 + index % 28:02d} 12:00:00\n".encode()
+            + b"========================================================\n\n"
+            + f"Build fingerprint: 'Xiaomi/fuxi/fuxi:14/UKQ1.230804.001/OS1.0.{index}.0.UMCCNXM:user/release-keys'\n".encode()
+            + b"------ SYSTEM PROPERTIES (getprop) ------\n"
+            + b"[persist.sys.locale]: [en-US]\n[persist.sys.timezone]: [Asia/Shanghai]\n"
+            + b"------ SYSTEM LOG (logcat) ------\n"
+        )
+        write_filler(f, lines=filler_lines * 2 // 3)
+
+        f.write(
+            b"------ DUMPSYS (dumpsys) ------\n"
+            b"DUMP OF SERVICE batterystats:\n"
+            b"Statistics since last charge:\n"
+            + f"  Estimated battery capacity: {4400 - index} mAh\n".encode()
+            + f"  Last learned battery capacity: {4300 - index} mAh\n".encode()
+            + f"  Min learned battery capacity: {4200 - index} mAh\n".encode()
+            + f"  Max learned battery capacity: {4350 - index} mAh\n".encode()
+        )
+        write_filler(f, lines=filler_lines // 3)
+
+        f.write(
+            b"DUMP OF SERVICE android.hardware.health.IHealth/default:\n"
+            + f"ac: 0 usb: 1\ncycle count: {100 + index}\nFull charge: {4500000 - index * 1000}\n".encode()
+            + b"getHealthInfo -> HealthInfo{chargerAcOnline: false, batteryFullChargeDesignCapacityUah: 4500000}\n"
+        )
+
+    return path
+
+
+def record_throughput(benchmark, size_bytes: int) -> None:
+    """
+    Store the throughput of the mean round of a finished benchmark in its extra info, in MB/s.
+    It is also listed at the end of the session, as the benchmark table only shows times.
+    Nothing is recorded when the benchmark did not time its rounds, e.g. with `--benchmark-disable`.
+    """
+    if benchmark.stats is None:
+        return
+
+    throughput = round(size_bytes / 1024 ** 2 / benchmark.stats.stats.mean, 1)
+    benchmark.extra_info["size_mb"] = round(size_bytes / 1024 ** 2, 1)
+    benchmark.extra_info["throughput_mb_s"] = throughput
+    THROUGHPUTS[benchmark.fullname.rsplit("::", 1)[-1]] = throughput
@@ -0,0 +1,53 @@
+import mmap
+
+import pytest
+
+from src.analysis.parser import SCAN_RULES, Parser, SectionIndex, parse_file
+from src.persistence import BatterySnapshot
+from benchmarks.synthetic import REPORT_SIZES, record_throughput
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("size_mb", REPORT_SIZES, ids=lambda size: f"{size}MB")
+def test_parse_file_mmap(benchmark, bugreport_factory, size_mb):
+    path = bugreport_factory(size_mb)
+
+    record = benchmark.pedantic(parse_file, args=(path, ), rounds=3, iterations=1)
+
+    assert record is not None and BatterySnapshot._make(record).nickname == "fuxi"
+    record_throughput(benchmark, size_bytes=path.stat().st_size)
+
+
+@pytest.mark.parametrize("size_mb", REPORT_SIZES, ids=lambda size: f"{size}MB")
+def test_parse_stream(benchmark, bugreport_factory, size_mb):
+    path = bugreport_factory(size_mb)
+    parser = Parser()
+
+    def parse():
+        with open(path, mode="rb") as stream:
+            return parser.parse_stream(stream=stream)
+
+    record = benchmark.pedantic(parse, rounds=3, iterations=1)
+
+    assert record is not None and record.nickname == "fuxi"
+    record_throughput(benchmark, size_bytes=path.stat().st_size)
+
+
+@pytest.mark.parametrize("rule", list(SCAN_RULES))
+@pytest.mark.parametrize("size_mb", REPORT_SIZES, ids=lambda size: f"{size}MB")
+def test_extract_field(benchmark, bugreport_factory, size_mb, rule):
+    # A fresh index per round, so the section headers are located again as they are for a real file.
+    # Header fields stop at their first match near the top of the file, the others walk the index to their section.
+    path = bugreport_factory(size_mb)
+
+    with open(path, mode="rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        def extract():
+            found = {}
+            Parser._extract(index=SectionIndex(buf=mm), pending={rule: SCAN_RULES[rule]}, found=found)  # noqa
+            return found
+
+        found = benchmark.pedantic(extract, rounds=3, iterations=1)
+
+    assert set(found) == set(SCAN_RULES[rule][2])
+    record_throughput(benchmark, size_bytes=path.stat().st_size)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.visualizer import Visualizer
+
+pytest.importorskip("pytest_benchmark")
+
+ROW_COUNTS = [1_000, 100_000, 1_000_000]
+
+
+def preprocess_by_row(visualizer: Visualizer, raw: pd.DataFrame, target_timezone: str) -> pd.DataFrame:
+    """
+    `Visualizer._preprocess` before it worked column-wise, kept as the baseline of the benchmark.
+    """
+    df = raw.copy()
+    df["log_capture_time"] = pd.to_datetime(df["log_capture_time"], unit="s", utc=True)
+    df["log_capture_time"] = df["log_capture_time"].dt.tz_convert(tz=target_timezone).dt.tz_localize(None)  # noqa
+
+    for field in visualizer.cap_fields:
+        df[field] = pd.to_numeric(df[field], errors="coerce")
+
+    df = df[
+        (df[visualizer.cap_fields] >= visualizer.cap_range[0]).all(axis=1) &
+        (df[visualizer.cap_fields] <= visualizer.cap_range[1]).all(axis=1) &
+        df["nickname"].notna()
+    ]
+    return df.sort_values(by="log_capture_time", ascending=False).reset_index(drop=True)
+
+
+def make_frame(visualizer: Visualizer, rows: int) -> pd.DataFrame:
+    # Newest first as SQLite returns them, with about a third of the captures out of range.
+    rng = np.random.default_rng(0)
+    columns = {
+        "log_capture_time": 1_700_000_000 + np.arange(rows)[::-1] * 600,
+        "nickname": pd.array(["fuxi"] * rows, dtype="str"),
+        "design_capacity": np.full(rows, 4500),
+    }
+    for field in visualizer.cap_fields:
+        columns[field] = rng.integers(500, 5000, rows)
+
+    return pd.DataFrame(columns)
+
+
+@pytest.mark.parametrize("implementation", ["column_wise", "row_wise"])
+@pytest.mark.parametrize("rows", ROW_COUNTS, ids=lambda rows: f"{rows}_rows")
+def test_preprocess(benchmark, rows, implementation):
+    visualizer = Visualizer()
+    frame = make_frame(visualizer=visualizer, rows=rows)
+
+    if implementation == "column_wise":
+        result = benchmark(visualizer._preprocess, frame, "Asia/Shanghai")  # noqa
+    else:
+        result = benchmark(preprocess_by_row, visualizer, frame, "Asia/Shanghai")
+
+    benchmark.extra_info["result_mb"] = round(result.memory_usage(deep=True).sum() / 1024 ** 2, 1)
+    assert not result.empty
@@ -0,0 +1,65 @@
+import multiprocessing
+import pickle
+import tracemalloc
+
+import pytest
+
+from src.persistence import BatterySnapshot
+
+pytest.importorskip("pytest_benchmark")
+
+RECORD_COUNT = 10_000
+KINDS = ["snapshot", "tuple", "dict"]
+
+
+def make_records(kind: str) -> list[BatterySnapshot] | list[tuple] | list[dict[str, str | int]]:
+    snapshots = [
+        BatterySnapshot(
+            "Xiaomi", f"model-{i % 20}", f"OS2.0.{i % 7}.0.VNCCNXM", 5000, 1700000000 + i * 3600, i,
+            4800 - i % 500, 4700, 4600, 4500, 4900
+        )
+        for i in range(RECORD_COUNT)
+    ]
+    if kind == "snapshot":
+        return snapshots
+
+    return [tuple(snapshot) for snapshot in snapshots] if kind == "tuple" else [snapshot._asdict() for snapshot in snapshots]
+
+
+def restore(kind: str, record: BatterySnapshot | tuple | dict[str, str | int]) -> BatterySnapshot | dict[str, str | int]:
+    # Workers send plain tuples, the parent rebuilds the snapshot, so the rebuild is part of the cost.
+    return BatterySnapshot._make(record) if kind == "tuple" else record
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_pickle_batch(benchmark, kind):
+    tracemalloc.start()
+    records = make_records(kind=kind)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    restored = benchmark(lambda: [restore(kind, record) for record in pickle.loads(pickle.dumps(records))])
+
+    assert restored == [restore(kind, record) for record in records]
+    benchmark.extra_info["bytes_per_record_memory"] = round(memory / RECORD_COUNT)
+    benchmark.extra_info["bytes_per_record_pickled"] = round(len(pickle.dumps(records)) / RECORD_COUNT)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_pipe_per_record(benchmark, kind):
+    # Workers send each result back on its own, as the result of one future.
+    records = make_records(kind=kind)[:1000]
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+
+    def send_all() -> int:
+        for record in records:
+            sender.send(record)
+            restore(kind, receiver.recv())
+
+        return len(records)
+
+    try:
+        assert benchmark(send_all) == len(records)
+    finally:
+        sender.close()
+        receiver.close()
@@ -0,0 +1,103 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.analysis.parser import parse_file, worker_parser
+from src.processing import WorkerPool
+from benchmarks.synthetic import write_bugreport
+
+pytest.importorskip("pytest_benchmark")
+
+ROOT = Path(__file__).parents[1]
+
+# Started like run.py: the entry point is the main module and the web app is loaded in the server process only.
+# Workers import the main module again, so anything it imports at the top is paid by every worker.
+PROBE = """
+import sys
+sys.path.insert(0, {root!r})
+
+from run import *  # noqa
+
+from src.processing import WorkerPool
+
+
+def loaded_modules() -> list[str]:
+    return [name for name in ("pandas", "plotly", "dash", "src.analysis.visualizer") if name in sys.modules]
+
+
+if __name__ == "__main__":
+    from app import app  # noqa
+
+    pool = WorkerPool()
+    try:
+        with pool.lease(workers=1) as executor:
+            print(",".join(executor.submit(loaded_modules).result()))
+    finally:
+        pool.shutdown()
+"""
+
+
+@pytest.fixture(scope="module")
+def small_report(tmp_path_factory) -> Path:
+    # Only the header and the battery sections, so a task costs little more than its round trip.
+    return write_bugreport(path=tmp_path_factory.mktemp("worker") / "bugreport-fuxi-small.txt", size_mb=0)
+
+
+@pytest.fixture(scope="module")
+def pool() -> WorkerPool:
+    pool = WorkerPool()
+    yield pool
+    pool.shutdown()
+
+
+def test_worker_modules(benchmark, tmp_path):
+    # Workers of the pool of a running server must not load the web app, pandas or plotly.
+    probe = tmp_path / "probe.py"
+    probe.write_text(PROBE.format(root=str(ROOT)))
+
+    def run_probe() -> str:
+        return subprocess.run(
+            [sys.executable, probe], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    loaded = benchmark.pedantic(run_probe, rounds=3, iterations=1)
+    assert loaded == ""
+
+
+def test_worker_import(benchmark):
+    # What every new worker process imports: the parsing core only, without pandas and plotly.
+    command = [
+        sys.executable, "-c",
+        "import sys, src.processing.battery_processor; assert 'pandas' not in sys.modules and 'plotly' not in sys.modules"
+    ]
+
+    benchmark.pedantic(subprocess.run, args=(command, ), kwargs={"cwd": ROOT, "check": True}, rounds=5, iterations=1)
+
+
+def test_cold_pool_first_task(benchmark, small_report):
+    # Starting a worker from scratch, as every run did before the pool was kept warm.
+    def first_task():
+        pool = WorkerPool()
+        try:
+            with pool.lease(workers=1) as executor:
+                return executor.submit(parse_file, small_report).result()
+        finally:
+            pool.shutdown()
+
+    record = benchmark.pedantic(first_task, rounds=5, iterations=1)
+    assert record is not None
+
+
+@pytest.mark.parametrize("entry", ["function", "bound_method"])
+def test_warm_task_round_trip(benchmark, pool, small_report, entry):
+    # Top-level functions only pickle the path of each task, bound methods pickle their whole instance too.
+    task = parse_file if entry == "function" else worker_parser()._parse_info  # noqa
+
+    with pool.lease(workers=1) as executor:
+        executor.submit(task, small_report).result()
+
+        record = benchmark(lambda: executor.submit(task, small_report).result())
+
+    assert record is not None
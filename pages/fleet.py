@@ -0,0 +1,115 @@
+import dash
+import dash_ag_grid as dag
+import dash_bootstrap_components as dbc
+from dash import html, dcc, Input, Output, State, no_update
+from dash.development.base_component import Component
+
+from src import DataServices, Visualizer, END_OF_LIFE_HEALTH
+
+dash.register_page(__name__, path="/fleet", order=6, name="Fleet")
+
+
+def get_fleet_grid() -> dag.AgGrid:
+    """
+    Build the grid of the degradation statistics of all models. Selecting rows restricts the chart to them.
+    """
+    stats = DataServices().get_fleet_stats()
+
+    column_defs = [
+        {"field": "rank", "headerName": "Rank", "filter": "agNumberColumnFilter", "maxWidth": 140},
+        {"field": "nickname", "headerName": "Device", "filter": "agTextColumnFilter"},
+        {
+            "field": "current_health",
+            "headerName": "Current Health (%)",
+            "filter": "agNumberColumnFilter",
+            "cellStyle": {
+                "styleConditions": [
+                    {
+                        "condition": f"params.value < {END_OF_LIFE_HEALTH}",
+                        "style": {"color": "#dc3545", "fontWeight": "bold"}  # Red
+                    },
+                    {
+                        "condition": f"params.value >= {END_OF_LIFE_HEALTH}",
+                        "style": {"color": "#198754", "fontWeight": "bold"}  # Green
+                    },
+                ],
+            },
+        },
+        {"field": "degradation", "headerName": "Degradation (mAh / 100 cycles)", "filter": "agNumberColumnFilter"},
+        {"field": "latest_cycle_count", "headerName": "Cycles", "filter": "agNumberColumnFilter"},
+        {
+            "field": "end_of_life_cycle_count",
+            "headerName": f"Cycles at {END_OF_LIFE_HEALTH}% Health",
+            "filter": "agNumberColumnFilter"
+        },
+        {"field": "valid_count", "headerName": "Valid Captures", "filter": "agNumberColumnFilter"},
+    ]
+
+    return dag.AgGrid(
+        id="fleet-data-grid",
+        columnDefs=column_defs,
+        rowData=stats.to_dict("records") if stats is not None else [],
+        defaultColDef={"resizable": True, "sortable": True, "filter": True, "floatingFilter": True},
+        columnSize="sizeToFit",
+        dashGridOptions={
+            "rowSelection": {"mode": "multiRow", "checkboxes": True, "headerCheckbox": True, "enableClickSelection": False},
+            "pagination": True,
+            "paginationPageSize": 20,
+            "animateRows": True
+        },
+        getRowId="params.data.nickname",
+        style={"height": "600px"},
+        className="ag-theme-alpine",
+    )
+
+
+def layout() -> list[Component]:
+    return [
+        dbc.Card([
+            dbc.CardHeader([
+                html.I(className="bi bi-graph-down-arrow me-2"),
+                "Health Trajectories"
+            ]),
+            dbc.CardBody(
+                dcc.Loading(dcc.Graph(id="fleet-graph", responsive=True, style={"height": "625px"}))
+            ),
+        ], class_name="shadow-sm mb-4"),
+        dbc.Alert(
+            id="fleet-alert",
+            is_open=False,
+            color="warning",
+        ),
+        dbc.Card([
+            dbc.CardHeader([
+                html.I(className="bi bi-trophy me-2"),
+                "Fleet Ranking"
+            ]),
+            dbc.CardBody([
+                get_fleet_grid()
+            ], class_name="p-0"),
+        ], class_name="shadow-sm"),
+    ]
+
+
+@dash.callback(
+    [
+        Output("fleet-graph", "figure"),
+        Output("fleet-alert", "is_open"),
+        Output("fleet-alert", "children"),
+    ],
+    Input("fleet-data-grid", "selectedRows"),
+    State("global-timezone", "data"),
+)
+def update_fleet_graph(selected_rows: list[dict] | None, timezone: str) -> tuple[dict, bool, str]:
+    # All models until some are selected.
+    nicknames = [row["nickname"] for row in selected_rows] if selected_rows else None
+
+    try:
+        figure = Visualizer().get_fleet_figure(timezone=timezone, data_services=DataServices(), nicknames=nicknames)
+    except ValueError as e:
+        return no_update, True, str(e)
+
+    if figure is None:
+        return no_update, True, "No valid data yet, upload and process some logs first."
+
+    return figure, False, no_update
@@ -1,6 +1,7 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import html, dcc, Input, Output, State, no_update
+import plotly.graph_objects as go
+from dash import html, dcc, Input, Output, State, MATCH, ctx, no_update
 from dash.development.base_component import Component
 
 from src import DataServices, Visualizer
@@ -83,17 +84,19 @@ def update_graphs(n_clicks: int, model: str | None, timezone: str) -> tuple[Comp
         return no_update, True, format_alert_content(title="Error", content="Not a valid model."), "danger"
 
     try:
-        raw_data = ds.get_battery_data("analysis_results", model=model)
-        viz = Visualizer()
-
-        trend_graph = viz.gen_battery_changing_chart(data=raw_data, model=model, timezone=timezone)
-        health_graph = viz.gen_battery_health_chart(data=raw_data, model=model, timezone=timezone)
+        trend_graph, health_graph = Visualizer().get_model_figures(model=model, timezone=timezone, data_services=ds)
 
         graphs_layout = dbc.Row([
             dbc.Col([
                 dbc.Card([
                     dbc.CardHeader("Capacity History Trend"),
-                    dbc.CardBody(dcc.Graph(figure=trend_graph, responsive=True, style={"height": "625px"})),
+                    dbc.CardBody(dcc.Graph(
+                        # The model is part of the id, so zooming re-fetches the captures of the model drawn.
+                        id={"type": "trend-graph", "model": model},
+                        figure=trend_graph,
+                        responsive=True,
+                        style={"height": "625px"}
+                    )),
                 ], class_name="shadow-sm mb-4 h-100"),
             ], width=12, lg=7),
             dbc.Col([
@@ -107,3 +110,42 @@ def update_graphs(n_clicks: int, model: str | None, timezone: str) -> tuple[Comp
         return graphs_layout, False, no_update, no_update
     except Exception as e:
         return no_update, True, format_alert_content(title="Error", content=f"Visualization Error: {str(e)}"), "danger"
+
+
+@dash.callback(
+    Output({"type": "trend-graph", "model": MATCH}, "figure"),
+    Input({"type": "trend-graph", "model": MATCH}, "relayoutData"),
+    State("global-timezone", "data"),
+    prevent_initial_call=True
+)
+def zoom_trend_graph(relayout_data: dict | None, timezone: str) -> dict | go.Figure:
+    """
+    Redraw the trend chart with the detail of the zoomed range, as large data is downsampled to
+    `Visualizer.point_budget` points for the whole range. Resetting the zoom brings back the whole chart.
+    """
+    if not relayout_data:
+        return no_update
+
+    model = ctx.triggered_id["model"]
+    ds = DataServices()
+    viz = Visualizer()
+
+    if relayout_data.get("xaxis.autorange"):
+        return viz.get_model_figures(model=model, timezone=timezone, data_services=ds)[0]
+
+    if "xaxis.range[0]" in relayout_data:
+        x_range = (relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"])
+    elif "xaxis.range" in relayout_data:
+        x_range = tuple(relayout_data["xaxis.range"])
+    else:
+        return no_update
+
+    raw_data = ds.get_battery_frame("analysis_results", model=model, columns=viz.chart_fields)
+    if raw_data is None or len(raw_data) <= viz.point_budget:
+        # Every capture is drawn already.
+        return no_update
+
+    try:
+        return viz.gen_battery_changing_chart(model=model, timezone=timezone, data=raw_data, x_range=x_range)
+    except ValueError:
+        return no_update
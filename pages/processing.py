@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal, Callable
+from typing import Literal
 
 import dash
 import dash_bootstrap_components as dbc
@@ -8,14 +8,18 @@ from dash.development.base_component import Component
 
 from components import ThreadMode
 from src import UPLOAD_PATH
-from utils import format_alert_content, analysis_pipeline
+from utils import format_alert_content, pipeline_runner
 
 dash.register_page(__name__, path="/processing", order=3, name="Processing")
 
 
-def get_store() -> list[dcc.Store]:
+def get_store() -> list[dcc.Store | dcc.Interval]:
     return [
         dcc.Store(id="deletion-target-file", data=[]),
+        # Id of the pipeline run started by this browser session, kept across page visits.
+        dcc.Store(id="pipeline-run-id", storage_type="session"),
+        # Polls once on load, so a run that finished while the page was closed still shows its result.
+        dcc.Interval(id="process-poller", interval=500, disabled=False),
     ]
 
 
@@ -114,6 +118,16 @@ def layout() -> list[Component]:
                         ),
                     ], width=12, md=6),
                 ]),
+                dbc.Row([
+                    dbc.Col(
+                        dbc.Checkbox(
+                            id="keep-txt-checkbox",
+                            label="Keep extracted txt files",
+                            value=False,
+                        ),
+                        width=12,
+                    ),
+                ]),
                 dbc.Row([
                     dbc.Col(
                         dbc.Button([
@@ -351,51 +365,81 @@ def confirm_deletion(
 
 @dash.callback(
     [
+        Output("process-poller", "disabled"),
+        Output("start-process-btn", "disabled"),
+        Output("bulk-delete-btn", "disabled"),
+        Output("operation-mode-selector", "disabled"),
+        Output("thread-mode-selector", "disabled"),
+        Output("keep-txt-checkbox", "disabled"),
+        Output("progress-collapse", "is_open"),
+        Output("progress", "value"),
+        Output("status-text", "children"),
         Output("pro-alert", "is_open", allow_duplicate=True),
         Output("pro-alert", "children", allow_duplicate=True),
         Output("pro-alert", "color", allow_duplicate=True),
-        Output("progress-collapse", "is_open"),
+        Output("pipeline-run-id", "data"),
+    ],
+    [
+        Input("start-process-btn", "n_clicks"),
+        Input("process-poller", "n_intervals"),
     ],
-    Input("start-process-btn", "n_clicks"),
     [
         State("operation-mode-selector", "value"),
         State("thread-mode-selector", "value"),
-    ],
-    background=True,
-    running=[
-        (Output("start-process-btn", "disabled"), True, False),
-        (Output("bulk-delete-btn", "disabled"), True, False),
-        (Output("operation-mode-selector", "disabled"), True, False),
-        (Output("thread-mode-selector", "disabled"), True, False),
-        (Output("progress-collapse", "is_open"), True, False),
-        (Output("status-text", "children"), "Initializing...", ""),
-    ],
-    progress=[
-        Output("progress", "value"),
-        Output("status-text", "children"),
+        State("keep-txt-checkbox", "value"),
+        State("pipeline-run-id", "data"),
     ],
     prevent_initial_call=True,
 )
 def decompress_handler(
-        set_progress: Callable,
-        _,
+        _1, _2,
         opt_mode: Literal["init", "append"],
-        thread: Literal["low", "medium", "high"]
-) -> tuple[bool, list[dbc.Row], str, bool]:
-    try:
-        results = analysis_pipeline(mode=opt_mode, thread=thread, set_progress=set_progress)
-
-        if results["status"] == "success":
-            msg = [
-                results["message"] + " You can click ",
-                dcc.Link("here", href="/graphs"),
-                " to generate graphs, or click ",
-                dcc.Link("here", href="/reports"),
-                " to view your log data."
-            ]
-            return True, format_alert_content("Analysis Complete", msg), "success", False
-
-        return True, format_alert_content("Analysis Failed", results["message"]), "danger", False
-
-    except Exception as e:
-        return True, format_alert_content("Critical Error", f"An unexpected error occurred: {str(e)}"), "danger", False
\ No newline at end of file
+        thread: Literal["low", "medium", "high"],
+        keep_txt: bool,
+        run_id: str | None
+) -> tuple[bool, bool, bool, bool, bool, bool, bool, str, str, bool, list[dbc.Row], str, str | None]:
+    # The pipeline runs in the server process, so its warm worker pool is reused across runs.
+    # This callback starts a run, then polls its progress until it finishes.
+    # Only one run is allowed per server, each session only sees the progress and result of its own run.
+    busy = (False, ) + (True, ) * 6
+
+    if ctx.triggered_id == "start-process-btn":
+        run_id = pipeline_runner.start(mode=opt_mode, thread=thread, keep_txt=bool(keep_txt))
+        if run_id is None:
+            alert = (True, format_alert_content("Warning", "Another analysis is still running."), "warning")
+            return busy + ("0", "Waiting for another analysis to finish...") + alert + (no_update, )
+
+        return busy + pipeline_runner.get_run(run_id).progress + (False, no_update, no_update, run_id)
+
+    run = pipeline_runner.get_run(run_id)
+    if run is not None and run.is_running():
+        return busy + run.progress + (no_update, ) * 4
+
+    if run is None and pipeline_runner.is_running():
+        return busy + ("0", "Waiting for another analysis to finish...") + (no_update, ) * 4
+
+    idle = (True, ) + (False, ) * 6 + ("0", "")
+    if run is None:
+        return idle + (no_update, ) * 4
+
+    pipeline_runner.discard(run.run_id)
+
+    if run.error is not None:
+        msg = f"An unexpected error occurred: {str(run.error)}"
+        return idle + (True, format_alert_content("Critical Error", msg), "danger", None)
+
+    results = run.results
+    if results is None:
+        return idle + (no_update, ) * 3 + (None, )
+
+    if results["status"] in ("success", "warning"):
+        msg = [
+            results["message"] + " You can click ",
+            dcc.Link("here", href="/graphs"),
+            " to generate graphs, or click ",
+            dcc.Link("here", href="/reports"),
+            " to view your log data."
+        ]
+        return idle + (True, format_alert_content("Analysis Complete", msg), results["status"], None)
+
+    return idle + (True, format_alert_content("Analysis Failed", results["message"]), "danger", None)
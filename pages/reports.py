@@ -2,13 +2,40 @@ import dash
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
 import pandas as pd
-from dash import html, Input, Output, State
+from dash import html, Input, Output, State, MATCH, ctx, no_update
 from dash.development.base_component import Component
 
 from src.analysis import DataServices
+from src.config import END_OF_LIFE_HEALTH
+from src.persistence.analysis_results import Clause
 
 dash.register_page(__name__, path="/reports", order=5, name="Reports")
 
+# Rows fetched per request of the records grid.
+GRID_BLOCK_SIZE = 100
+
+# Grid columns that are not table columns.
+GRID_COLUMN_MAPPING = {"display_time": "log_capture_time"}
+
+NUMBER_FILTER_OPERATORS = {
+    "equals": "=",
+    "notEqual": "!=",
+    "lessThan": "<",
+    "lessThanOrEqual": "<=",
+    "greaterThan": ">",
+    "greaterThanOrEqual": ">=",
+}
+
+# LIKE patterns of the text filter types, `{}` is the escaped filter text.
+TEXT_FILTER_PATTERNS = {
+    "contains": ("LIKE", "%{}%"),
+    "notContains": ("NOT LIKE", "%{}%"),
+    "equals": ("=", "{}"),
+    "notEqual": ("!=", "{}"),
+    "startsWith": ("LIKE", "{}%"),
+    "endsWith": ("LIKE", "%{}"),
+}
+
 
 def get_general_card(title: str, value: str | int, icon: str, color: str) -> dbc.Col:
     return dbc.Col([
@@ -23,19 +50,113 @@ def get_general_card(title: str, value: str | int, icon: str, color: str) -> dbc
                 ], className="d-flex align-items-center"),
             ]),
         ], class_name="shadow-sm h-100 border-0 border-start border-4")
-    ], width=12, sm=6, lg=3, class_name="mb-3")
+    ], width=12, sm=6, lg=4, class_name="mb-3")
 
 
-def layout():
-    models = DataServices().get_model() or []
-    default_val = models[0] if models else None
+def to_display_time(df: pd.DataFrame, timezone: str) -> pd.DataFrame:
+    utc_series = pd.to_datetime(df["log_capture_time"], unit="s", utc=True)
+    return df.assign(
+        display_time=utc_series.dt.tz_convert(tz=timezone).dt.tz_localize(None).dt.strftime("%Y-%m-%d %H:%M:%S")  # noqa
+    )
+
+
+def day_range(date_str: str, timezone: str) -> tuple[int, int]:
+    """
+    Get the UNIX timestamps of the start of a day in `timezone`, and of the start of the next one.
+    """
+    start = pd.Timestamp(date_str).normalize().tz_localize(timezone)
+    end = start + pd.Timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def condition_to_clause(column: str, condition: dict, timezone: str) -> Clause:
+    """
+    Translate one AG Grid column filter condition into a clause of alternatives, see `Clause`.
+    Unsupported filter types match every row.
+    """
+    filter_type = condition.get("type")
+    if filter_type == "blank":
+        return ((column, "IS NULL", None), )
+    if filter_type == "notBlank":
+        return ((column, "IS NOT NULL", None), )
+
+    match condition.get("filterType"):
+        case "date":
+            # Capture times are compared by day in the display timezone, as the grid shows them.
+            if not condition.get("dateFrom"):
+                return ()
+
+            start, end = day_range(condition["dateFrom"], timezone)
+            match filter_type:
+                case "equals":
+                    return ((column, "BETWEEN", (start, end - 1)), )
+                case "notEqual":
+                    return ((column, "<", start), (column, ">=", end))
+                case "lessThan":
+                    return ((column, "<", start), )
+                case "greaterThan":
+                    return ((column, ">=", end), )
+                case "inRange" if condition.get("dateTo"):
+                    return ((column, "BETWEEN", (start, day_range(condition["dateTo"], timezone)[1] - 1)), )
+
+        case "number":
+            value = condition.get("filter")
+            if value is None:
+                return ()
+
+            if filter_type == "inRange" and condition.get("filterTo") is not None:
+                return ((column, "BETWEEN", (value, condition["filterTo"])), )
+            if filter_type in NUMBER_FILTER_OPERATORS:
+                return ((column, NUMBER_FILTER_OPERATORS[filter_type], value), )
+
+        case "text":
+            value = condition.get("filter")
+            if value is None or filter_type not in TEXT_FILTER_PATTERNS:
+                return ()
+
+            operator, pattern = TEXT_FILTER_PATTERNS[filter_type]
+            if "LIKE" in operator:
+                value = pattern.format(str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+            return ((column, operator, value), )
+
+    return ()
+
+
+def filter_to_conditions(filter_model: dict, timezone: str) -> tuple[Clause, ...]:
+    """
+    Translate the filter model of the records grid into clauses for `DataServices.get_battery_page`.
+    """
+    clauses = []
+    for field, column_filter in sorted(filter_model.items()):
+        column = GRID_COLUMN_MAPPING.get(field, field)
+
+        if "conditions" not in column_filter:
+            clauses.append(condition_to_clause(column, column_filter, timezone))
+            continue
+
+        sub_clauses = [condition_to_clause(column, condition, timezone) for condition in column_filter["conditions"]]
+        if column_filter.get("operator") == "OR":
+            # One empty alternative matches every row, so the whole clause does.
+            if all(sub_clauses):
+                clauses.append(tuple(alternative for clause in sub_clauses for alternative in clause))
+        else:
+            clauses.extend(sub_clauses)
+
+    return tuple(clause for clause in clauses if clause)
+
 
+def get_data_grid(model: str) -> dag.AgGrid:
+    """
+    Build the records grid of a model. It uses the infinite row model: rows, sorting and filtering
+    are served block by block by `get_report_rows`. The model is part of the id, so selecting another model
+    mounts a new grid instead of showing the blocks cached by the previous one.
+    """
     column_defs = [
         {
             "field": "display_time",
             "headerName": "Log Capture Time",
             "sortable": True,
-            "filter": True,
+            "filter": "agDateColumnFilter",
             "minWidth": 180,
             "pinned": "left"
         },
@@ -96,8 +217,14 @@ def layout():
             "filter": "agNumberColumnFilter",
             "cellStyle": {
                 "styleConditions": [
-                    {"condition": "params.value < 80", "style": {"color": "#dc3545", "fontWeight": "bold"}},  # Red
-                    {"condition": "params.value >= 80", "style": {"color": "#198754", "fontWeight": "bold"}}  # Green
+                    {
+                        "condition": f"params.value < {END_OF_LIFE_HEALTH}",
+                        "style": {"color": "#dc3545", "fontWeight": "bold"}  # Red
+                    },
+                    {
+                        "condition": f"params.value >= {END_OF_LIFE_HEALTH}",
+                        "style": {"color": "#198754", "fontWeight": "bold"}  # Green
+                    }
                 ],
             },
         },
@@ -109,6 +236,32 @@ def layout():
         },
     ]
 
+    return dag.AgGrid(
+        id={"type": "reports-data-grid", "model": model},
+        columnDefs=column_defs,
+        defaultColDef={
+            "resizable": True,
+            "filter": True,
+            "sortable": True,
+            "floatingFilter": True
+        },
+        columnSize="sizeToFit",
+        rowModelType="infinite",
+        dashGridOptions={
+            "pagination": True,
+            "paginationPageSize": 20,
+            "cacheBlockSize": GRID_BLOCK_SIZE,
+            "animateRows": True
+        },
+        style={"height": "600px"},
+        className="ag-theme-alpine",
+    )
+
+
+def layout():
+    models = DataServices().get_model() or []
+    default_val = models[0] if models else None
+
     return [
         dbc.Card([
             dbc.CardBody([
@@ -135,25 +288,7 @@ def layout():
                 "Detailed Records"
             ]),
             dbc.CardBody([
-                dag.AgGrid(
-                    id="reports-data-grid",
-                    columnDefs=column_defs,
-                    rowData=[],
-                    defaultColDef={
-                        "resizable": True,
-                        "filter": True,
-                        "sortable": True,
-                        "floatingFilter": True
-                    },
-                    columnSize="sizeToFit",
-                    dashGridOptions={
-                        "pagination": True,
-                        "paginationPageSize": 20,
-                        "animateRows": True
-                    },
-                    style={"height": "600px"},
-                    className="ag-theme-alpine",
-                )
+                html.Div(id="reports-grid-container")
             ], class_name="p-0"),
         ], class_name="shadow-sm"),
     ]
@@ -162,39 +297,82 @@ def layout():
 @dash.callback(
     [
         Output("reports-general-container", "children"),
-        Output("reports-data-grid", "rowData"),
+        Output("reports-grid-container", "children"),
     ],
     Input("reports-model-selector", "value"),
     State("global-timezone", "data")
 )
-def update_report(model: str, timezone: str) -> tuple[list[Component], list[dict[str, str | int | float]]]:
+def update_report(model: str, timezone: str) -> tuple[list[Component], Component | list]:
     if not model:
         return ([], ) * 2
 
-    raw_data = DataServices().get_battery_data("analysis_results", model=model, health_snapshots=True)
-    if not raw_data:
+    summary = DataServices().get_model_summary(model=model)
+    if not summary:
         return ([], ) * 2
 
-    df = pd.DataFrame(raw_data)
-
-    utc_series = pd.to_datetime(df["log_capture_time"], unit="s", utc=True)
-    df["display_time"] = utc_series.dt.tz_convert(tz=timezone).dt.tz_localize(None).dt.strftime("%Y-%m-%d %H:%M:%S")  # noqa
-
-    latest_data = df.iloc[0]
+    display_time = pd.Timestamp(summary["latest_capture_time"], unit="s", tz="UTC").tz_convert(timezone)
 
-    current_health = latest_data.get("health_snapshots", 0.0)
-    if current_health >= 80:
+    current_health = summary["latest_health_snapshots"]
+    if current_health >= END_OF_LIFE_HEALTH:
         color = "success"
     elif current_health >= 60:
         color = "warning"
     else:
         color = "danger"
 
+    projection = DataServices().get_degradation_projection(model=model) or {}
+    eol_cycle_count, eol_time = projection.get("end_of_life_cycle_count"), projection.get("end_of_life_time")
+    eol_date = pd.Timestamp(eol_time, unit="s", tz="UTC").tz_convert(timezone) if eol_time is not None else None
+
     general_cards = [
-        get_general_card("Last Capture Time", latest_data["display_time"], "bi-clock-history", "primary"),
-        get_general_card("Current Cycle Count", latest_data["cycle_count"], "bi-arrow-repeat", "info"),
-        get_general_card("Design Capacity", f"{latest_data["design_capacity"]} mAh", "bi-battery-full", "secondary"),
-        get_general_card("Latest Health Snapshot", f"{current_health}%", "bi-heart-pulse-fill", color)
+        get_general_card("Last Capture Time", display_time.strftime("%Y-%m-%d %H:%M:%S"), "bi-clock-history", "primary"),
+        get_general_card("Current Cycle Count", summary["latest_cycle_count"], "bi-arrow-repeat", "info"),
+        get_general_card("Design Capacity", f"{summary["latest_design_capacity"]} mAh", "bi-battery-full", "secondary"),
+        get_general_card("Latest Health Snapshot", f"{current_health}%", "bi-heart-pulse-fill", color),
+        get_general_card(
+            f"Cycles at {END_OF_LIFE_HEALTH}% Health",
+            f"~{eol_cycle_count}" if eol_cycle_count is not None else "Not degrading",
+            "bi-hourglass-split",
+            "warning"
+        ),
+        get_general_card(
+            f"{END_OF_LIFE_HEALTH}% Health ETA",
+            eol_date.strftime("%Y-%m-%d") if eol_date is not None else "Not degrading",
+            "bi-calendar-event",
+            "warning"
+        ),
     ]
 
-    return general_cards, df.to_dict("records")
+    return general_cards, get_data_grid(model)
+
+
+@dash.callback(
+    Output({"type": "reports-data-grid", "model": MATCH}, "getRowsResponse"),
+    Input({"type": "reports-data-grid", "model": MATCH}, "getRowsRequest"),
+    State("global-timezone", "data"),
+    prevent_initial_call=True
+)
+def get_report_rows(request: dict | None, timezone: str) -> dict[str, list[dict[str, str | int | float]] | int]:
+    if not request:
+        return no_update
+
+    sort_by, descending = "log_capture_time", True
+    if request.get("sortModel"):
+        sort = request["sortModel"][0]
+        sort_by = GRID_COLUMN_MAPPING.get(sort["colId"], sort["colId"])
+        descending = sort["sort"] == "desc"
+
+    df, count = DataServices().get_battery_page(
+        "analysis_results",
+        model=ctx.triggered_id["model"],
+        start_row=request["startRow"],
+        end_row=request["endRow"],
+        sort_by=sort_by,
+        descending=descending,
+        conditions=filter_to_conditions(request.get("filterModel") or {}, timezone),
+        health_snapshots=True
+    )
+    if df is None:
+        return {"rowData": [], "rowCount": count}
+
+    return {"rowData": to_display_time(df, timezone).to_dict("records"), "rowCount": count}
@@ -3,14 +3,15 @@ from threading import Timer
 
 from waitress import serve
 
-from app import app
-
 
 def open_browser() -> None:
     webbrowser.open_new_tab("http://localhost:8050/")
 
 
 if __name__ == "__main__":
+    # Imported here: worker processes import this module again as `__mp_main__`, and must not load the web app.
+    from app import app
+
     try:
         print("Starting Server...")
         Timer(0.5, open_browser).start()
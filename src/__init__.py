@@ -1,8 +1,16 @@
-from .analysis import DataServices, Parser, Visualizer
+from .analysis import DataServices, Parser
 from .config import (
     INSTANCE_PATH, UPLOAD_PATH, DISKCACHE_PATH, TXT_PATH, DB_PATH, BATTERY_CAPACITY_MAPPING,
     BATTERY_CAPACITY_TYPES, BATTERY_CAPACITY_TYPES_IN_LOG, BATTERY_NUMERIC_FIELDS, ANALYSIS_RESULTS_FIELDS,
-    APP_VERSION
+    END_OF_LIFE_HEALTH, APP_VERSION, PARSER_VERSION
 )
-from .persistence import AnalysisResults
+from .persistence import AnalysisResults, ParseCache
 from .processing import BatteryProcessor
+
+
+def __getattr__(name: str):
+    if name == "Visualizer":
+        from .analysis import Visualizer
+        return Visualizer
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,3 +1,12 @@
 from .data_services import DataServices
 from .parser import Parser
-from .visualizer import Visualizer
\ No newline at end of file
+
+
+def __getattr__(name: str):
+    # Visualizer pulls in pandas and plotly, so it is only imported on first access.
+    # This keeps worker processes that only import the parser lightweight.
+    if name == "Visualizer":
+        from .visualizer import Visualizer
+        return Visualizer
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
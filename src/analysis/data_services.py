@@ -1,17 +1,36 @@
-from typing import Literal
+import math
+import time
+from operator import itemgetter
+from typing import Literal, TYPE_CHECKING
 
-from src.config import BATTERY_NUMERIC_FIELDS, ANALYSIS_RESULTS_FIELDS
-from src.persistence import AnalysisResults
+from src.config import BATTERY_NUMERIC_FIELDS, ANALYSIS_RESULTS_FIELDS, END_OF_LIFE_HEALTH
+from src.persistence import AnalysisResults, BatterySnapshot, DegradationStats, ModelSummary
+from src.persistence.degradation import SECONDS_PER_DAY
+from src.persistence.analysis_results import Clause
+from .query_cache import query_cache
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Relative tolerance of the slope denominator of least-squares fits, see `DataServices._has_distinct_x`.
+FIT_TOLERANCE = 1e-9
 
 type Table = Literal["analysis_results"]
+type BatteryData = BatterySnapshot | dict[str, str | int]
 
 
 class DataServices:
     def __init__(self):
         self.bat_numeric_fields = BATTERY_NUMERIC_FIELDS
         self.bat_whole_fields = ANALYSIS_RESULTS_FIELDS
+        self._bat_fields_getter = itemgetter(*self.bat_whole_fields)
 
         self.AR = AnalysisResults()
+        self.MS = ModelSummary()
+        self.DS = DegradationStats()
+
+        # Rows per second of the last bulk load, if any.
+        self.last_ingest_rate: float | None = None
 
     def __val_bat_info(self, data: dict[str, str | int]) -> None:
         missed_fields = [field for field in self.bat_whole_fields if field not in data.keys()]
@@ -22,22 +41,55 @@ class DataServices:
         if type_error_fields:
             raise Exception(f"Field(s) must be int: {", ".join(type_error_fields)}.")
 
-    def _battery_data_validator(self, data_list: list[dict[str, str | int]]) -> None:
+    def _is_valid_batch(self, data_list: list[BatteryData]) -> bool:
+        """
+        Check a whole list of battery data column-wise: all fields are gathered in one pass over the records
+        (a missing field stops it), then the set of value types of each numeric column must only hold int.
+        Snapshots always have every field, and are transposed as is.
+        """
+        record_types = set(map(type, data_list))
+        if record_types == {BatterySnapshot}:
+            rows = data_list
+        elif record_types == {dict}:
+            rows = map(self._bat_fields_getter, data_list)
+        else:
+            return False
+
+        try:
+            values = dict(zip(self.bat_whole_fields, zip(*rows)))
+        except KeyError:
+            return False
+
+        return all(
+            issubclass(value_type, int)
+            for field in self.bat_numeric_fields
+            for value_type in set(map(type, values.get(field, ())))
+        )
+
+    def _battery_data_validator(self, data_list: list[BatteryData]) -> None:
         """
         Validate a list of battery data.
+        Valid batches are checked column-wise by `_is_valid_batch`; records are only checked one by one
+        to build the error report when the batch is invalid.
 
         Parameters
         ----------
-        data_list: list[dict[str, str | int]]
-            A list of battery data dictionaries.
+        data_list: list[BatteryData]
+            A list of battery snapshots or battery data dictionaries.
 
         Raises
         -------
         ValueError
             If data has incorrect field types or lack of required fields.
         """
+        if self._is_valid_batch(data_list=data_list):
+            return
+
         errors = []
         for i, data in enumerate(data_list, start=1):
+            if isinstance(data, BatterySnapshot):
+                data = data._asdict()
+
             try:
                 self.__val_bat_info(data=data)
             except Exception as e:
@@ -52,11 +104,25 @@ class DataServices:
                 f"{all_errors}"
             )
 
+    @staticmethod
+    def _as_snapshots(data_list: list[BatteryData]) -> list[BatterySnapshot]:
+        if all(isinstance(data, BatterySnapshot) for data in data_list):
+            return data_list
+
+        return [data if isinstance(data, BatterySnapshot) else BatterySnapshot.from_dict(data) for data in data_list]
 
-    def init_data(self, table: Table, data: dict[str, str | int] | list[dict[str, str | int]]) -> int:
+    def init_data(
+            self,
+            table: Table,
+            data: BatteryData | list[BatteryData],
+            bulk: bool = True
+    ) -> int:
         """
         Initialize table and save data into it.
-        If table exists, it will be dropped and recreated.
+        Existing data of the table is deleted, its schema and indexes are kept.
+
+        With `bulk`, data is loaded through the bulk-load path of the table, and the ingest throughput
+        is recorded in `last_ingest_rate`.
 
         Raises
         -------
@@ -69,19 +135,30 @@ class DataServices:
             The number of data saved successfully.
         """
 
-        data_list = [data] if isinstance(data, dict) else data
+        data_list = [data] if isinstance(data, (dict, BatterySnapshot)) else data
         if not data_list:
             raise ValueError("Data is empty.")
 
         if table == "analysis_results":
             self._battery_data_validator(data_list=data_list)
+            data_list = self._as_snapshots(data_list=data_list)
 
-            self.AR.init_table()
-            return self.AR.save_data(data=data_list)
+            if not bulk:
+                # One transaction, readers never see the emptied table.
+                with self.AR.writer():
+                    self.AR.init_table()
+                    return self.AR.save_data(data=data_list)
+
+            start = time.perf_counter()
+            counts = self.AR.bulk_load(data=data_list)
+            elapsed = time.perf_counter() - start
+
+            self.last_ingest_rate = counts / elapsed if elapsed > 0 else None
+            return counts
 
         raise ValueError("Invalid table name.")
 
-    def append_data(self, table: Table, data: dict[str, str | int] | list[dict[str, str | int]]) -> int:
+    def append_data(self, table: Table, data: BatteryData | list[BatteryData]) -> int:
         """
         Append battery data to the existing table.
 
@@ -95,18 +172,41 @@ class DataServices:
         int
             The number of data saved successfully.
         """
-        data_list = [data] if isinstance(data, dict) else data
+        data_list = [data] if isinstance(data, (dict, BatterySnapshot)) else data
         if not data_list:
             raise ValueError("Data is empty.")
 
         if table == "analysis_results":
             self._battery_data_validator(data_list=data_list)
+            data_list = self._as_snapshots(data_list=data_list)
             return self.AR.save_data(data=data_list)
 
         raise ValueError("Invalid table name.")
 
+    def get_unsaved_data(self, table: Table, data: list[BatterySnapshot]) -> list[BatterySnapshot]:
+        """
+        Keep the battery data that is not stored in the table yet, see `AnalysisResults.get_unsaved`.
+        """
+        if table == "analysis_results":
+            return self.AR.get_unsaved(data=data) if data else []
+
+        raise ValueError("Invalid table name.")
+
     def get_battery_data(self, table: Table, model: str | None = None, health_snapshots: bool = False) -> list[dict[str, str | int | float]] | None:
+        """
+        Get battery data of a model, newest first.
+
+        Results are served from the shared query cache until the next write to the table.
+        They are shared between callers and must not be modified.
+        """
         if table == "analysis_results":
+            key = (table, model, health_snapshots)
+            generation = self.AR.get_generation()
+
+            results = query_cache.get(key=key, generation=generation)
+            if results is not None:
+                return results
+
             results = self.AR.get_results(model=model)
             if not results:
                 return None
@@ -118,12 +218,289 @@ class DataServices:
 
                     result["health_snapshots"] = round((hw_cap / design_cap) * 100, 2) if design_cap and design_cap > 0 else 0.00
 
+            query_cache.set(key=key, generation=generation, value=results)
             return results
 
         raise ValueError("Invalid table name.")
 
+    def get_battery_frame(
+            self,
+            table: Table,
+            model: str | None = None,
+            columns: list[str] | None = None,
+            health_snapshots: bool = False
+    ) -> "pd.DataFrame | None":
+        """
+        Get battery data of a model as a DataFrame, newest first. Only `columns` are read, all if None.
+
+        Frames are served from the shared query cache until the next write to the table.
+        They are shared between callers and must not be modified in place, use `assign` or `copy` instead.
+        """
+        if table == "analysis_results":
+            key = (table, model, tuple(columns) if columns else None, health_snapshots, "frame")
+            generation = self.AR.get_generation()
+
+            frame = query_cache.get(key=key, generation=generation)
+            if frame is not None:
+                return frame
+
+            frame = self.AR.get_results_frame(model=model, columns=columns, health_snapshots=health_snapshots)
+            if frame is None:
+                return None
+
+            query_cache.set(key=key, generation=generation, value=frame)
+            return frame
+
+        raise ValueError("Invalid table name.")
+
+    def get_battery_page(
+            self,
+            table: Table,
+            model: str | None = None,
+            start_row: int = 0,
+            end_row: int = 100,
+            sort_by: str = "log_capture_time",
+            descending: bool = True,
+            conditions: tuple[Clause, ...] = (),
+            health_snapshots: bool = False
+    ) -> tuple["pd.DataFrame | None", int]:
+        """
+        Get rows [`start_row`, `end_row`) of battery data ordered by (`sort_by`, id), and the total row count.
+
+        The key of the last row of every page is kept in the shared query cache, so the next page is read
+        with keyset pagination instead of an OFFSET scan. The count is cached as well.
+        Both are dropped on the next write to the table.
+
+        Returns
+        -------
+        tuple[pd.DataFrame or None, int]
+            The page, None if it is empty, and the number of rows matching `conditions`.
+        """
+        if table == "analysis_results":
+            generation = self.AR.get_generation()
+            filter_key = (table, model, conditions)
+            order_key = filter_key + (sort_by, descending)
+
+            count_key = filter_key + ("count", )
+            count = query_cache.get(key=count_key, generation=generation)
+            if count is None:
+                count = self.AR.count_results(model=model, conditions=conditions)
+                query_cache.set(key=count_key, generation=generation, value=count)
+
+            after = query_cache.get(key=order_key + ("cursor", start_row), generation=generation) if start_row else None
+            frame = self.AR.get_results_page(
+                model=model,
+                sort_by=sort_by,
+                descending=descending,
+                after=after,
+                offset=0 if after is not None or not start_row else start_row,
+                limit=end_row - start_row,
+                conditions=conditions,
+                health_snapshots=health_snapshots
+            )
+
+            if frame is not None:
+                # Column by column, so the key holds Python scalars: a row of mixed dtypes keeps numpy ones,
+                # which sqlite3 would bind as blobs.
+                cursor = tuple(frame[column].iloc[-1:].tolist()[0] for column in (sort_by, "id"))
+                query_cache.set(key=order_key + ("cursor", start_row + len(frame)), generation=generation, value=cursor)
+
+            return frame, count
+
+        raise ValueError("Invalid table name.")
+
+    def get_generation(self, table: Table) -> int:
+        """
+        Get the data generation of a table, bumped by every write, see `QueryCache`.
+        """
+        if table == "analysis_results":
+            return self.AR.get_generation()
+
+        raise ValueError("Invalid table name.")
+
+    def get_model_summary(self, model: str) -> dict[str, str | int | float | None] | None:
+        """
+        Get the pre-aggregated summary of a model, see `ModelSummary.get_summary`.
+        """
+        key = ("model_summary", model)
+        generation = self.AR.get_generation()
+
+        summary = query_cache.get(key=key, generation=generation)
+        if summary is not None:
+            return summary
+
+        summary = self.MS.get_summary(nickname=model)
+        if summary:
+            query_cache.set(key=key, generation=generation, value=summary)
+
+        return summary
+
+    def get_fleet_trends(self) -> "pd.DataFrame | None":
+        """
+        Get the health trajectories of all models, see `AnalysisResults.get_fleet_trends`.
+        Served from the shared query cache until the next write to the table.
+        """
+        key = ("analysis_results", "fleet_trends")
+        generation = self.AR.get_generation()
+
+        trends = query_cache.get(key=key, generation=generation)
+        if trends is not None:
+            return trends
+
+        trends = self.AR.get_fleet_trends()
+        if trends is not None:
+            query_cache.set(key=key, generation=generation, value=trends)
+
+        return trends
+
+    def get_fleet_stats(self) -> "pd.DataFrame | None":
+        """
+        Get the degradation statistics of all models, ranked by current health.
+        Served from the shared query cache until the next write to the table.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            One row per model, healthiest first, None if there are no valid results.
+
+            - rank : 1 for the healthiest model, models without a current health come last
+            - nickname, valid_count, latest_cycle_count, current_health : see `AnalysisResults.get_fleet_stats`
+            - degradation : slope of the least-squares fit of hardware capacity against cycle count,
+              in mAh per 100 cycles, NaN if all valid captures share the same cycle count
+            - end_of_life_cycle_count : cycle count at which the fit reaches `END_OF_LIFE_HEALTH`,
+              NA if the capacity does not decrease
+        """
+        key = ("analysis_results", "fleet_stats")
+        generation = self.AR.get_generation()
+
+        stats = query_cache.get(key=key, generation=generation)
+        if stats is not None:
+            return stats
+
+        sums = self.AR.get_fleet_stats()
+        if sums is None:
+            return None
+
+        # Like pandas, only needed by the web pages, keep it out of the parser worker processes.
+        import numpy as np
+
+        # Floats, as the products of the sums overflow int64 at millions of captures.
+        n, sum_x, sum_y, sum_xx, sum_xy = (
+            sums[column].astype("float64") for column in ("valid_count", "sum_x", "sum_y", "sum_xx", "sum_xy")
+        )
+        denominator = n * sum_xx - sum_x * sum_x
+        slope = (n * sum_xy - sum_x * sum_y) / denominator.where(self._has_distinct_x(denominator, n, sum_xx))
+        intercept = (sum_y - slope * sum_x) / n
+
+        target = sums["recent_design_capacity"].astype("float64") * END_OF_LIFE_HEALTH / 100
+        end_of_life = np.ceil((target - intercept) / slope.where(slope < 0))
+
+        stats = sums[["nickname", "valid_count", "latest_cycle_count", "current_health"]].assign(
+            degradation=(slope * 100).round(2),
+            end_of_life_cycle_count=end_of_life.astype("Int64"),
+            rank=sums["current_health"].rank(ascending=False, method="min", na_option="bottom").astype("int64")
+        ).sort_values(by=["rank", "nickname"], ignore_index=True)
+
+        query_cache.set(key=key, generation=generation, value=stats)
+        return stats
+
+    @staticmethod
+    def _has_distinct_x(
+            denominator: "float | pd.Series",
+            n: "int | pd.Series",
+            sum_xx: "float | pd.Series"
+    ) -> "bool | pd.Series":
+        """
+        Whether the x of a least-squares fit are not all equal, given the denominator `n * sum_xx - sum_x ** 2` of
+        its slope. Element-wise for series. The bound is relative, as float sums of equal x may not cancel out exactly.
+        """
+        return denominator > FIT_TOLERANCE * n * sum_xx
+
+    @staticmethod
+    def _fit_line(n: int, sum_x: float, sum_xx: float, sum_y: float, sum_xy: float) -> tuple[float, float] | None:
+        """
+        Get the (slope, intercept) of the least-squares line of y against x from its sufficient statistics,
+        None if there are less than two distinct x.
+        """
+        denominator = n * sum_xx - sum_x * sum_x
+        if n < 2 or not DataServices._has_distinct_x(denominator, n, sum_xx):
+            return None
+
+        slope = (n * sum_xy - sum_x * sum_y) / denominator
+        return slope, (sum_y - slope * sum_x) / n
+
+    def get_degradation_projection(self, model: str) -> dict[str, int | float | None] | None:
+        """
+        Project when a model reaches `END_OF_LIFE_HEALTH`, from the fits of the hardware capacity of its valid captures
+        against cycle count and against time. The fits are kept up to date on every write (see `DegradationStats`),
+        so a projection is a few arithmetic operations.
+
+        Returns
+        -------
+        dict[str, int | float | None] or None
+            None if the model has no valid captures, otherwise a dictionary with keys:
+
+            - end_of_life_health : `END_OF_LIFE_HEALTH`, in percent of the recent design capacity
+            - capacity_per_100_cycles : slope of the fit against cycle count, in mAh
+            - capacity_per_year : slope of the fit against time, in mAh
+            - end_of_life_cycle_count : cycle count at which the capacity line reaches end of life
+            - end_of_life_time : UNIX timestamp at which the capacity line reaches end of life
+
+            Slopes are None without two distinct cycle counts or capture times. Projections are None when
+            the capacity does not decrease, or the design capacity is unknown.
+        """
+        key = ("degradation_projection", model)
+        generation = self.AR.get_generation()
+
+        projection = query_cache.get(key=key, generation=generation)
+        if projection is not None:
+            return projection
+
+        stats = self.DS.get_stats(nickname=model)
+        if stats is None:
+            return None
+
+        design_capacity = stats["recent_design_capacity"]
+        target = design_capacity * END_OF_LIFE_HEALTH / 100 if design_capacity else None
+
+        projection = {
+            "end_of_life_health": END_OF_LIFE_HEALTH,
+            "capacity_per_100_cycles": None,
+            "capacity_per_year": None,
+            "end_of_life_cycle_count": None,
+            "end_of_life_time": None
+        }
+
+        cycle_fit = self._fit_line(stats["n"], stats["sum_c"], stats["sum_cc"], stats["sum_y"], stats["sum_cy"])
+        if cycle_fit is not None:
+            slope, intercept = cycle_fit
+            projection["capacity_per_100_cycles"] = round(slope * 100, 2)
+            if target is not None and slope < 0:
+                projection["end_of_life_cycle_count"] = math.ceil((target - intercept) / slope)
+
+        time_fit = self._fit_line(stats["n"], stats["sum_t"], stats["sum_tt"], stats["sum_y"], stats["sum_ty"])
+        if time_fit is not None:
+            slope, intercept = time_fit
+            projection["capacity_per_year"] = round(slope * 365.25, 2)
+            if target is not None and slope < 0:
+                projection["end_of_life_time"] = int((target - intercept) / slope * SECONDS_PER_DAY)
+
+        query_cache.set(key=key, generation=generation, value=projection)
+        return projection
+
     def get_model(self) -> list[str] | None:
-        return self.AR.get_unique_model()
+        key = ("analysis_results", "models")
+        generation = self.AR.get_generation()
+
+        models = query_cache.get(key=key, generation=generation)
+        if models is not None:
+            return models
+
+        models = self.AR.get_unique_model()
+        if models:
+            query_cache.set(key=key, generation=generation, value=models)
+
+        return models
 
 
 if __name__ == "__main__":
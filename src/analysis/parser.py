@@ -1,10 +1,151 @@
+import logging
+import mmap
+import os
 import re
 from concurrent.futures import ProcessPoolExecutor, Future
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO, Iterator
 from zoneinfo import ZoneInfo
 
 from src.config import BATTERY_CAPACITY_MAPPING, BATTERY_CAPACITY_TYPES_IN_LOG, ANALYSIS_RESULTS_FIELDS
+from src.persistence import BatterySnapshot
+
+logger = logging.getLogger(__name__)
+
+# Size of each chunk read from a bugreport stream. Peak memory per worker is bounded by this value.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Section names used by the scanner. `None` scope means the field may appear in any section.
+BATTERYSTATS_SECTION = "batterystats"
+IHEALTH_SECTION = "android.hardware.health.IHealth/default"
+HEALTH_INFO_SECTION = "getHealthInfo"
+
+# Registry of every compiled pattern used by the parser, compiled once per process at import time.
+# Patterns run directly over the raw bytes of a bugreport. Field patterns capture their value in the
+# `value` group. A pattern that covers several fields also captures the field name in the `field` group.
+PATTERNS: dict[str, re.Pattern[bytes]] = {
+    "section": re.compile(
+        rb"^(?:DUMP OF SERVICE (?:(?:CRITICAL|HIGH|NORMAL) )?(?P<service>\S+):[ \t]*\r?$"
+        rb"|------ (?P<dumpstate>.+?) ------[ \t]*\r?$"
+        rb"|(?P<health_info>getHealthInfo -> HealthInfo\{))",
+        re.M
+    ),
+    "dumpstate_time": re.compile(rb"^== dumpstate: (?P<value>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", re.M),
+    "timezone": re.compile(rb"^\[persist\.sys\.timezone\]: \[(?P<value>.*?)\]", re.M),
+    "fingerprint": re.compile(rb"Build fingerprint: '(?P<value>[^']+)'"),
+    "cycle_count": re.compile(rb"cycle count:\s*(?P<value>\d+)"),
+    "hardware_capacity": re.compile(rb"Full charge:\s*(?P<value>\d+)"),
+    "design_capacity": re.compile(rb"batteryFullChargeDesignCapacityUah:\s*(?P<value>\d+)"),
+    "battery_capacity": re.compile(
+        fr"(?P<field>{"|".join(re.escape(cap) for cap in BATTERY_CAPACITY_TYPES_IN_LOG)}): \s*(?P<value>[\d.]+)\s*mAh".encode()
+    ),
+}
+
+# Runs over the decoded build fingerprint, not over the bugreport.
+FINGERPRINT_DETAILS_PATTERN = re.compile(r"([^/]+):\d+/\S+/([^:]+(?:\.[^/]+)+)(?=:)")
+
+# Scanner rules: name -> (section scope, pattern, raw fields the pattern fills).
+SCAN_RULES: dict[str, tuple[str | None, re.Pattern[bytes], tuple[str, ...]]] = {
+    "dumpstate_time": (None, PATTERNS["dumpstate_time"], ("dumpstate_time", )),
+    "timezone": (None, PATTERNS["timezone"], ("timezone", )),
+    "fingerprint": (None, PATTERNS["fingerprint"], ("fingerprint", )),
+    "cycle_count": (IHEALTH_SECTION, PATTERNS["cycle_count"], ("cycle_count", )),
+    "hardware_capacity": (IHEALTH_SECTION, PATTERNS["hardware_capacity"], ("hardware_capacity", )),
+    "design_capacity": (HEALTH_INFO_SECTION, PATTERNS["design_capacity"], ("design_capacity", )),
+    "battery_capacity": (BATTERYSTATS_SECTION, PATTERNS["battery_capacity"], tuple(BATTERY_CAPACITY_TYPES_IN_LOG)),
+}
+
+
+class SectionIndex:
+    """
+    Byte offsets of the sections of a bugreport buffer: the `------ <name> ------` dumpstate markers,
+    the `DUMP OF SERVICE <name>:` headers and the IHealth `getHealthInfo` line.
+
+    The index is built lazily while extractors walk it, and every located section is kept,
+    so any number of extractors can share one index without rescanning the buffer.
+    """
+    def __init__(self, buf: bytes | mmap.mmap, section: str | None = None) -> None:
+        """
+        Parameters
+        ----------
+        buf: bytes or mmap.mmap
+            Line-aligned bugreport content.
+        section: str or None
+            Name of the section the buffer starts in, e.g. when the buffer is a chunk of a stream.
+        """
+        self.buf = buf
+        self.sections: list[tuple[str | None, int, int]] = []
+
+        self._headers = PATTERNS["section"].finditer(buf)
+        self._section = section
+        self._start = 0
+        self._complete = False
+
+    def _advance(self) -> bool:
+        """
+        Locate the next section.
+
+        Returns
+        -------
+        bool
+            True if a section was added to the index, False if the whole buffer is indexed.
+        """
+        if self._complete:
+            return False
+
+        header = next(self._headers, None)
+        if header is None:
+            self.sections.append((self._section, self._start, len(self.buf)))
+            self._complete = True
+            return True
+
+        self.sections.append((self._section, self._start, header.start()))
+
+        if header.lastgroup == "health_info":
+            self._section = HEALTH_INFO_SECTION
+        else:
+            self._section = header.group(header.lastgroup).decode(errors="ignore")
+        self._start = header.start()
+        return True
+
+    def iter_sections(self) -> Iterator[tuple[str | None, int, int]]:
+        """
+        Iterate over (name, start, end) of every section in order, extending the index only as far as needed.
+        """
+        i = 0
+        while i < len(self.sections) or self._advance():
+            yield self.sections[i]
+            i += 1
+
+    def ranges(self, name: str) -> Iterator[tuple[int, int]]:
+        """
+        Iterate over the byte ranges of every section with the given name.
+        """
+        for section, start, end in self.iter_sections():
+            if section == name:
+                yield start, end
+
+    def finditer(self, pattern: re.Pattern[bytes], name: str | None = None) -> Iterator[re.Match[bytes]]:
+        """
+        Search the sections with the given name in place. If name is None, the whole buffer is searched.
+        """
+        if name is None:
+            yield from pattern.finditer(self.buf)
+            return
+
+        for start, end in self.ranges(name=name):
+            yield from pattern.finditer(self.buf, start, end)
+
+    @property
+    def last_section(self) -> str | None:
+        """
+        Name of the section the buffer ends in. Accessing it indexes the whole buffer.
+        """
+        for _ in self.iter_sections():
+            pass
+
+        return self._section
 
 
 class Parser:
@@ -12,16 +153,121 @@ class Parser:
         self.cap_mapping = BATTERY_CAPACITY_MAPPING
         self.cap_types = BATTERY_CAPACITY_TYPES_IN_LOG
         self.whole_fields = ANALYSIS_RESULTS_FIELDS
+        self.chunk_size = CHUNK_SIZE
 
     @staticmethod
-    def _parse_hardware_info(string: str) -> dict[str, int] | None:
+    def _extract(
+            index: SectionIndex,
+            pending: dict[str, tuple[str | None, re.Pattern[bytes], tuple[str, ...]]],
+            found: dict[str, bytes]
+    ) -> None:
+        """
+        Run every pending rule over the byte ranges of its own section only.
+
+        Parameters
+        ----------
+        index: SectionIndex
+            Section index of the buffer to search.
+        pending: dict[str, tuple[str | None, re.Pattern[bytes], tuple[str, ...]]]
+            Scanner rules whose fields are not all found yet. Completed rules are removed in place.
+        found: dict[str, bytes]
+            Raw field values collected so far. Updated in place.
+        """
+        for name, (scope, pattern, fields) in list(pending.items()):
+            for matched in index.finditer(pattern=pattern, name=scope):
+                field = matched.group("field").decode() if "field" in pattern.groupindex else fields[0]
+                found.setdefault(field, matched.group("value"))
+                if all(field in found for field in fields):
+                    del pending[name]
+                    break
+
+    @staticmethod
+    def _decode(found: dict[str, bytes]) -> dict[str, str]:
+        # Only the small matched groups are ever decoded.
+        return {field: value.decode("utf-8", errors="ignore") for field, value in found.items()}
+
+    def _scan(self, stream: BinaryIO) -> dict[str, str]:
+        """
+        Read a bugreport once in chunks and collect every raw field in a single pass.
+
+        Chunks are cut on line boundaries and indexed by section, so that each field
+        pattern only runs over the sections it belongs to. Reading stops as soon as
+        every field has been found.
+
+        Parameters
+        ----------
+        stream: BinaryIO
+            A binary stream of the bugreport content.
+
+        Returns
+        -------
+        dict[str, str]
+            Raw field values keyed by the fields of `SCAN_RULES`.
         """
-        Parse hardware information from the given content.
+        pending = dict(SCAN_RULES)
+        found = {}
+
+        section = None
+        remainder = b""
+        while pending:
+            data = stream.read(self.chunk_size)
+            if data:
+                data = remainder + data
+                cut = data.rfind(b"\n") + 1
+                if cut == 0:
+                    remainder = data
+                    continue
+
+                chunk, remainder = data[:cut], data[cut:]
+            else:
+                chunk, remainder = remainder, b""
+
+            index = SectionIndex(buf=chunk, section=section)
+            self._extract(index=index, pending=pending, found=found)
+            section = index.last_section
+
+            if not data:
+                break
+
+        return self._decode(found=found)
+
+    def _scan_mmap(self, path: Path) -> dict[str, str]:
+        """
+        Memory-map a bugreport file and collect every raw field from the mapped bytes.
+        Each rule only searches the byte ranges of its own section, located through a shared `SectionIndex`.
+        Nothing but the matched groups is copied into Python objects, so memory use does not grow with the file size.
 
         Parameters
         ----------
-        string: str
-            Battery info content.
+        path: Path
+            Path of the bugreport txt file.
+
+        Returns
+        -------
+        dict[str, str]
+            Raw field values keyed by the fields of `SCAN_RULES`.
+        """
+        pending = dict(SCAN_RULES)
+        found = {}
+
+        with open(path, mode="rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return {}
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self._extract(index=SectionIndex(buf=mm), pending=pending, found=found)
+
+        return self._decode(found=found)
+
+    @staticmethod
+    def _parse_hardware_info(raw: dict[str, str]) -> dict[str, int] | None:
+        """
+        Parse hardware information from the given raw fields.
+
+        Parameters
+        ----------
+        raw: dict[str, str]
+            Raw field values collected by the scanner.
 
         Returns
         -------
@@ -32,43 +278,31 @@ class Parser:
         hardware_info = {}
 
         try:
-            block_pattern = re.compile(
-                r"^DUMP OF SERVICE android\.hardware\.health\.IHealth/default:\s*\n"
-                r"(.*?)(?=^getHealthInfo -> HealthInfo\{)", re.M | re.S
-            )
-            block_match = re.search(pattern=block_pattern, string=string)
-            if not block_match:
-                return None
-
-            sub_string = block_match.group(1)
-            cycle_match = re.search(pattern=r"cycle count:\s*(\d+)", string=sub_string)
-            if cycle_match:
-                hardware_info["cycle_count"] = int(float(cycle_match.group(1)))
+            if "cycle_count" in raw:
+                hardware_info["cycle_count"] = int(float(raw["cycle_count"]))
 
-            capacity_match = re.search(pattern=r"Full charge:\s*(\d+)", string=sub_string)
-            if capacity_match:
-                hardware_info["hardware_capacity"] = int(float(capacity_match.group(1)) / 1000)
+            if "hardware_capacity" in raw:
+                hardware_info["hardware_capacity"] = int(float(raw["hardware_capacity"]) / 1000)
 
-            design_cap = re.search(pattern=r"batteryFullChargeDesignCapacityUah:\s*(\d+)", string=string)
-            if design_cap:
-                hardware_info["design_capacity"] = int(float(design_cap.group(1)) / 1000)
+            if "design_capacity" in raw:
+                hardware_info["design_capacity"] = int(float(raw["design_capacity"]) / 1000)
 
             return hardware_info
 
-        except re.error:
+        except ValueError:
             return None
 
     @staticmethod
-    def _parse_battery_cap(cap: str, string: str) -> int | None:
+    def _parse_battery_cap(cap: str, raw: dict[str, str]) -> int | None:
         """
-        Parse battery capacity from the given contents.
+        Parse battery capacity from the given raw fields.
 
         Parameters
         ----------
         cap: str
             Capacity name.
-        string: str
-            Battery info content.
+        raw: dict[str, str]
+            Raw field values collected by the scanner.
 
         Returns
         -------
@@ -76,20 +310,19 @@ class Parser:
             Battery capacity value, if available.
         """
         try:
-            matched = re.search(pattern=fr"{cap}: \s*([\d.]+)\s*mAh", string=string)
-            return int(float(matched.group(1))) if matched else None
-        except re.error:
+            return int(float(raw[cap])) if cap in raw else None
+        except ValueError:
             return None
 
     @staticmethod
-    def _parse_device_info(string: str) -> dict[str, str] | None:
+    def _parse_device_info(fingerprint: str | None) -> dict[str, str] | None:
         """
-        Parse device info (brand, model, nickname, system version) from the given content.
+        Parse device info (brand, model, nickname, system version) from the build fingerprint.
 
         Parameters
         ----------
-        string: str
-            Battery info content.
+        fingerprint: str or None
+            Build fingerprint of the device.
 
         Returns
         -------
@@ -99,14 +332,12 @@ class Parser:
         device_info = {}
 
         try:
-            matched = re.search(pattern=r"Build fingerprint: '([^']+)'", string=string)
-            if not matched:
+            if not fingerprint:
                 return None
 
-            fingerprint = matched.group(1)
             device_info["phone_brand"] = fingerprint.split("/", 1)[0]
 
-            details = re.search(pattern=r"([^/]+):\d+/\S+/([^:]+(?:\.[^/]+)+)(?=:)", string=fingerprint)
+            details = FINGERPRINT_DETAILS_PATTERN.search(fingerprint)
             if not details:
                 return None
 
@@ -124,57 +355,63 @@ class Parser:
             return None
 
     @staticmethod
-    def _get_timestamp(string: str) -> int | None:
+    def _get_timestamp(time_str: str | None, tz_name: str | None) -> int | None:
         try:
-            time_pattern = re.compile(r"^== dumpstate: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", re.M)
-            time_matched = re.search(pattern=time_pattern, string=string)
-            if not time_matched:
-                return None
-
-            time_str = time_matched.group(1)
-
-            tz_pattern = re.compile(r"^\[persist\.sys\.timezone\]: \[(.*?)\]", re.M)
-            tz_matched = re.search(pattern=tz_pattern, string=string)
-            if not tz_matched:
+            if not time_str or not tz_name:
                 return None
 
-            tz_name = tz_matched.group(1)
-
             local_dt = datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=ZoneInfo(tz_name))
             return int(local_dt.timestamp())
         except Exception: # noqa
             return None
 
-
-    def _parse_info(self, path: str | Path) -> dict[str, str | int] | None:
-        path = Path(path)
-        filename = path.stem
-        if not filename.startswith("bugreport") or path.suffix != ".txt":
+    def _build_record(self, raw: dict[str, str]) -> BatterySnapshot | None:
+        if not raw:
             return None
 
-        cont = path.read_text(encoding="utf-8", errors="ignore")
-        if not cont:
-            return None
-
-        log_capture_time = self._get_timestamp(string=cont)
+        log_capture_time = self._get_timestamp(time_str=raw.get("dumpstate_time"), tz_name=raw.get("timezone"))
 
         battery_cap = {}
         for cap_type in self.cap_types:
-            cap_data = self._parse_battery_cap(cap=cap_type, string=cont)
+            cap_data = self._parse_battery_cap(cap=cap_type, raw=raw)
             if cap_data:
                 battery_cap[self.cap_mapping[cap_type]] = cap_data
 
-        device_info = self._parse_device_info(string=cont) or {}
-        hardware_info = self._parse_hardware_info(string=cont) or {}
+        device_info = self._parse_device_info(fingerprint=raw.get("fingerprint")) or {}
+        hardware_info = self._parse_hardware_info(raw=raw) or {}
 
         parsed_data = {"log_capture_time": log_capture_time, **battery_cap, **device_info, **hardware_info}
 
         if any(parsed_data.get(field) is None for field in self.whole_fields):
             return None
 
-        return parsed_data
+        return BatterySnapshot.from_dict(parsed_data)
 
-    def parser(self, tps: list[str | Path], thread_count: int) -> list[dict[str, str | int]]:
+    def parse_stream(self, stream: BinaryIO) -> BatterySnapshot | None:
+        """
+        Parse battery information from a binary stream of a bugreport.
+
+        Parameters
+        ----------
+        stream: BinaryIO
+            A binary stream of the bugreport content, e.g. a member opened from a zip file.
+
+        Returns
+        -------
+        BatterySnapshot or None
+            Battery information, or None if any field is missing.
+        """
+        return self._build_record(raw=self._scan(stream=stream))
+
+    def _parse_info(self, path: str | Path) -> BatterySnapshot | None:
+        path = Path(path)
+        filename = path.stem
+        if not filename.startswith("bugreport") or path.suffix != ".txt":
+            return None
+
+        return self._build_record(raw=self._scan_mmap(path=path))
+
+    def parser(self, tps: list[str | Path], thread_count: int) -> list[BatterySnapshot]:
         """
         Parse battery information from the given path of files.
 
@@ -188,7 +425,7 @@ class Parser:
 
         Returns
         -------
-        list[dict[str, str | int]]
+        list[BatterySnapshot]
             A list of battery information.
         """
         if not isinstance(tps, list):
@@ -202,23 +439,56 @@ class Parser:
 
         workers = min(len(tps), thread_count)
 
-        with ProcessPoolExecutor(max_workers=workers) as executor:
-            futures: list[Future[dict[str, str | int] | None]] = [
-                executor.submit(self._parse_info, Path(path)) for path in tps
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            futures: list[Future[tuple | None]] = [
+                executor.submit(parse_file, Path(path)) for path in tps
             ]
 
             final_info = []
-            for future in futures:
+            for path, future in zip(tps, futures):
                 try:
                     results = future.result()
                     if results:
-                        final_info.append(results)
-                except Exception as e:
-                    print(e)
+                        final_info.append(BatterySnapshot._make(results))
+                except Exception:
+                    logger.exception("Failed to parse %s", path)
                     continue
 
         return final_info
 
 
+# Process-wide parser shared by every task that runs in the same worker process.
+_worker_parser: Parser | None = None
+
+
+def worker_parser() -> Parser:
+    """
+    Get the parser of the current process, creating it on first use.
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = Parser()
+
+    return _worker_parser
+
+
+def init_worker() -> None:
+    """
+    Initializer of pool worker processes.
+    Importing this module compiles every pattern of `PATTERNS` once, and the parser is built before the first task arrives.
+    """
+    worker_parser()
+
+
+def parse_file(path: str | Path) -> tuple | None:
+    """
+    Worker entry point: parse battery information from a txt file with the process-wide parser.
+    Only the path is pickled for each task, not a `Parser` instance.
+    The record is sent back as a plain tuple, which pickles faster than the named tuple, see `BatterySnapshot`.
+    """
+    record = worker_parser()._parse_info(path=path)  # noqa
+    return tuple(record) if record is not None else None
+
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,84 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# Upper bound of the estimated memory used by cached query results.
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _estimate_size(value: Any) -> int:
+    """
+    Roughly estimate the memory used by a query result, from its first row.
+    """
+    # DataFrames report their own size, without importing pandas here.
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        return int(memory_usage(index=True, deep=True).sum())
+
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(map(_estimate_size, value))
+
+    if not isinstance(value, list) or not value:
+        return sys.getsizeof(value)
+
+    first = value[0]
+    row_size = sys.getsizeof(first)
+    if isinstance(first, dict):
+        row_size += sum(sys.getsizeof(v) for v in first.values())
+
+    return sys.getsizeof(value) + row_size * len(value)
+
+
+class QueryCache:
+    """
+    A thread-safe, in-process LRU cache of query results, bounded by their estimated memory use.
+
+    Every entry is stored with the data generation it was read at. A lookup with a different
+    generation is a miss, so a single counter bumped by each write invalidates every entry.
+    Cached values are shared between callers and must not be modified.
+    """
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[Hashable, tuple[int, Any, int]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: int) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] != generation:
+                self._size -= self._entries.pop(key)[2]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, generation: int, value: Any) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+
+            self._entries[key] = (generation, value, size)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+query_cache = QueryCache()
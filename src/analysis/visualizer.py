@@ -1,8 +1,22 @@
+import json
+from typing import TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from src.config import BATTERY_CAPACITY_TYPES
+from src.config import BATTERY_CAPACITY_RANGE, BATTERY_CAPACITY_TYPES, HEALTH_WINDOW_SIZE
+from .query_cache import query_cache
+
+if TYPE_CHECKING:
+    from .data_services import DataServices
+
+# Above this number of captures, the trend chart switches to WebGL traces downsampled to this number of points.
+TREND_POINT_BUDGET = 1000
+
+# Above this number of devices, the fleet chart has no legend, devices are named on hover only.
+FLEET_LEGEND_LIMIT = 20
 
 
 class Visualizer:
@@ -10,28 +24,71 @@ class Visualizer:
         self.cap_fields = BATTERY_CAPACITY_TYPES + ["hardware_capacity"]
         self.avg_fields = [field for field in self.cap_fields if field != "estimated_battery_capacity"]
 
-        self.cap_range = (1000, 15000)
+        self.cap_range = BATTERY_CAPACITY_RANGE
+        self.point_budget = TREND_POINT_BUDGET
 
-    def _preprocess(self, raw: list[dict[str, str | int]], target_timezone: str) -> pd.DataFrame:
-        if not raw:
-            raise ValueError("No data provided.")
+        # Columns read by the charts, see `DataServices.get_battery_frame`.
+        self.chart_fields = ["log_capture_time", "nickname", "design_capacity"] + self.cap_fields
 
-        df = pd.DataFrame(raw)
-        df["log_capture_time"] = pd.to_datetime(df["log_capture_time"], unit="s", utc=True)
-        df["log_capture_time"] = df["log_capture_time"].dt.tz_convert(tz=target_timezone).dt.tz_localize(None) # noqa
+    def _preprocess(
+            self,
+            raw: list[dict[str, str | int]] | dict[str, list] | pd.DataFrame,
+            target_timezone: str
+    ) -> pd.DataFrame:
+        """
+        Keep the valid captures, newest first, with capture times converted to naive times of `target_timezone`
+        and capacities narrowed to int32.
 
-        for field in self.cap_fields:
-            df[field] = pd.to_numeric(df[field], errors="coerce")
+        Columns are handled as whole arrays: the capacities are cast once, filtered by a single mask
+        over all of them, and the rows are only reordered if they are not already newest first,
+        as they come from SQLite.
 
-        df = df[
-            (df[self.cap_fields] >= self.cap_range[0]).all(axis=1) &
-            (df[self.cap_fields] <= self.cap_range[1]).all(axis=1) &
-            df["nickname"].notna()
+        Parameters
+        ----------
+        raw: list[dict[str, str | int]] or dict[str, list] or pd.DataFrame
+            Captures, as records or columns. A frame may be shared by the query cache, it is never modified.
+        target_timezone: str
+            Timezone to convert capture times to.
+
+        Raises
+        -------
+        ValueError
+            If there is no data, or no valid data.
+        """
+        if raw is None or len(raw) == 0:
+            raise ValueError("No data provided.")
+
+        columns = raw if isinstance(raw, pd.DataFrame) else pd.DataFrame(raw)
+
+        capacities = [
+            np.asarray(columns[field]) if pd.api.types.is_numeric_dtype(columns[field])
+            else pd.to_numeric(columns[field], errors="coerce").to_numpy()
+            for field in self.cap_fields
         ]
-        df = df.sort_values(by="log_capture_time", ascending=False).reset_index(drop=True)
-        if df.empty:
+
+        # One pass per column over a shared mask. NaN fails both comparisons, so non-numeric capacities are dropped.
+        mask = np.array(columns["nickname"].notna())
+        for values in capacities:
+            mask &= (values >= self.cap_range[0]) & (values <= self.cap_range[1])
+
+        positions = np.flatnonzero(mask)
+        if positions.size == 0:
             raise ValueError("No valid data provided.")
-        
+
+        capture_times = np.asarray(columns["log_capture_time"], dtype=np.int64)[positions]
+        if (capture_times[:-1] < capture_times[1:]).any():
+            order = np.argsort(-capture_times, kind="stable")
+            positions, capture_times = positions[order], capture_times[order]
+
+        other_fields = [name for name in columns.columns if name not in self.cap_fields and name != "log_capture_time"]
+        df = columns[other_fields].take(positions).reset_index(drop=True)
+        for field, values in zip(self.cap_fields, capacities):
+            df[field] = values[positions].astype(np.int32)
+
+        df["log_capture_time"] = (
+            pd.to_datetime(capture_times, unit="s", utc=True).tz_convert(target_timezone).tz_localize(None)
+        )
+
         return df
 
     @staticmethod
@@ -56,9 +113,154 @@ class Visualizer:
             "health_percent": health_percent
         }
 
-    def gen_battery_changing_chart(self, model: str, timezone: str, data: list[dict[str, str | int]]) -> go.Figure:
+    def get_model_figures(
+            self,
+            model: str,
+            timezone: str,
+            data_services: "DataServices"
+    ) -> tuple[dict, dict]:
+        """
+        Get the capacity trend and battery health figures of a model.
+
+        Figures are serialized to JSON and kept in the shared query cache under (model, timezone),
+        until the next write to **analysis_results**. On a miss, the captures are preprocessed once
+        for both figures; the health figure comes from the model summary when there is one.
+
+        Raises
+        -------
+        ValueError
+            If the model has no valid data.
+
+        Returns
+        -------
+        tuple[dict, dict]
+            The trend and health figures, as dictionaries accepted by `dcc.Graph`.
+        """
+        key = ("figures", model, timezone)
+        generation = data_services.get_generation("analysis_results")
+
+        figures = query_cache.get(key=key, generation=generation)
+        if figures is None:
+            frame = data_services.get_battery_frame("analysis_results", model=model, columns=self.chart_fields)
+            df = self._preprocess(raw=frame, target_timezone=timezone)
+            trend_graph = self._gen_changing_figure(model=model, df=df)
+
+            summary = data_services.get_model_summary(model=model)
+            if summary:
+                health_graph = self.gen_battery_health_chart_from_summary(model=model, summary=summary)
+            else:
+                health_graph = self._gen_health_figure_from_frame(model=model, df=df)
+
+            projection = data_services.get_degradation_projection(model=model)
+            if projection:
+                self._add_projection(fig=health_graph, projection=projection, timezone=timezone)
+
+            figures = (trend_graph.to_json(), health_graph.to_json())
+            query_cache.set(key=key, generation=generation, value=figures)
+
+        return json.loads(figures[0]), json.loads(figures[1])
+
+    @staticmethod
+    def _lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+        """
+        Downsample a line with Largest-Triangle-Three-Buckets: the first and last points are kept, and from each
+        bucket in between the point forming the largest triangle with the previously kept point and
+        the mean of the next bucket, so peaks and dips survive.
+
+        Parameters
+        ----------
+        x: np.ndarray
+            Ascending x values, as numbers.
+        y: np.ndarray
+            Y values.
+        threshold: int
+            Number of points to keep.
+
+        Returns
+        -------
+        np.ndarray
+            Ascending indices of the kept points.
+        """
+        n = len(x)
+        if threshold >= n or threshold < 3:
+            return np.arange(n)
+
+        # Bucket i covers [edges[i], edges[i + 1]), the first and last points are buckets of their own.
+        edges = np.append((np.arange(threshold - 2) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1, n - 1)
+
+        indices = np.empty(threshold, dtype=np.int64)
+        indices[0], indices[-1] = 0, n - 1
+
+        a = 0
+        for i in range(threshold - 2):
+            start, end = edges[i], edges[i + 1]
+            next_end = edges[i + 2] if i + 2 < len(edges) else n
+
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+            areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+
+            a = start + int(areas.argmax())
+            indices[i + 1] = a
+
+        return indices
+
+    def gen_battery_changing_chart(
+            self,
+            model: str,
+            timezone: str,
+            data: list[dict[str, str | int]] | pd.DataFrame,
+            x_range: tuple[str, str] | None = None
+    ) -> go.Figure:
+        """
+        Generate the capacity trend chart of a model.
+
+        Parameters
+        ----------
+        model: str
+            Nickname of the device model.
+        timezone: str
+            Timezone the capture times are shown in.
+        data: list[dict[str, str | int]] or pd.DataFrame
+            Captures of the model.
+        x_range: tuple[str, str] or None
+            If given, only captures in this range of display times are drawn, e.g. the range of a zoom
+            reported by `relayoutData`. The average line is still the one of all captures.
+
+        Raises
+        -------
+        ValueError
+            If there is no valid data, or none in `x_range`.
+        """
         df = self._preprocess(raw=data, target_timezone=timezone)
-        df["avg_battery_capacity"] = df[self.avg_fields].mean().mean()
+        avg_capacity = df[self.avg_fields].mean().mean()
+
+        if x_range is not None:
+            in_range = df["log_capture_time"].between(pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1]))
+            if not in_range.any():
+                raise ValueError("No valid data in the selected range.")
+
+            # One capture beyond each end, so the lines run to the edges of the range.
+            df = df[in_range | in_range.shift(1, fill_value=False) | in_range.shift(-1, fill_value=False)]
+
+        return self._gen_changing_figure(model=model, df=df, avg_capacity=avg_capacity, x_range=x_range)
+
+    def _gen_changing_figure(
+            self,
+            model: str,
+            df: pd.DataFrame,
+            avg_capacity: float | None = None,
+            x_range: tuple[str, str] | None = None
+    ) -> go.Figure:
+        if avg_capacity is None:
+            avg_capacity = df[self.avg_fields].mean().mean()
+
+        # Large data is drawn by WebGL, which has no splines, from at most `point_budget` points per trace.
+        large_data = len(df) > self.point_budget
+        scatter = go.Scattergl if large_data else go.Scatter
+
+        # Oldest first, as the downsampling walks the line from its start.
+        df = df.iloc[::-1]
+        times = df["log_capture_time"].to_numpy()
 
         fig = make_subplots(
             rows=1, cols=1,
@@ -82,22 +284,30 @@ class Visualizer:
                 )
                 continue
 
+            x, y = times, df[field].to_numpy()
+            if large_data:
+                kept = self._lttb(
+                    x=x.astype(np.int64).astype(np.float64), y=y.astype(np.float64), threshold=self.point_budget
+                )
+                x, y = x[kept], y[kept]
+
             fig.add_trace(
-                go.Scatter(
-                    x=df["log_capture_time"],
-                    y=df[field],
+                scatter(
+                    x=x,
+                    y=y,
                     name=field,
                     mode="lines",
-                    line={"width": 2, "shape": "spline"},
+                    line={"width": 2} if large_data else {"width": 2, "shape": "spline"},
                     showlegend=True
                 ),
                 row=1, col=1
             )
 
+        # A constant line only needs its two ends.
         fig.add_trace(
-            go.Scatter(
-                x=df["log_capture_time"],
-                y=df["avg_battery_capacity"],
+            scatter(
+                x=[times[0], times[-1]],
+                y=[avg_capacity, avg_capacity],
                 name="Average Capacity",
                 mode="lines",
                 line={"width": 2, "dash": "dash", "color": "magenta"},
@@ -111,23 +321,165 @@ class Visualizer:
             legend={"orientation": "h", "yanchor": "top", "y": 1.2, "xanchor": "center", "x": 0.5},
             xaxis={"tickangle": 30, "tickmode": "auto", "nticks": 10},
             yaxis={"range": [df[self.cap_fields].min().min() * 0.98, df[self.cap_fields].max().max() * 1.02]},
-            hovermode="x unified"
+            hovermode="x unified",
+            # Keeps the zoom of the user when the figure is replaced by one with the detail of the zoomed range.
+            uirevision=model
         )
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
 
         return fig
 
-    
-    def gen_battery_health_chart(self, model: str, timezone: str, data: list[dict[str, str | int]]) -> go.Figure:
+    def get_fleet_figure(
+            self,
+            timezone: str,
+            data_services: "DataServices",
+            nicknames: list[str] | None = None
+    ) -> dict | None:
+        """
+        Get the health trajectories chart of the fleet, or of some of its models.
+
+        Like `get_model_figures`, the figure is kept as JSON in the shared query cache until the next write
+        to **analysis_results**, so the chart of hundreds of devices is only built once.
+
+        Parameters
+        ----------
+        timezone: str
+            Timezone the bucket times are shown in.
+        data_services: DataServices
+            Source of the trajectories, see `DataServices.get_fleet_trends`.
+        nicknames: list[str] or None
+            Models to draw, all if None or empty.
+
+        Raises
+        -------
+        ValueError
+            If none of the models have valid data.
+
+        Returns
+        -------
+        dict or None
+            The figure, as a dictionary accepted by `dcc.Graph`. None if there is no valid data at all.
+        """
+        nicknames = tuple(sorted(nicknames)) if nicknames else None
+        key = ("fleet_figure", timezone, nicknames)
+        generation = data_services.get_generation("analysis_results")
+
+        figure = query_cache.get(key=key, generation=generation)
+        if figure is None:
+            trends = data_services.get_fleet_trends()
+            if trends is None:
+                return None
+
+            if nicknames is not None:
+                trends = trends[trends["nickname"].isin(nicknames)]
+
+            figure = self.gen_fleet_health_chart(trends=trends, timezone=timezone).to_json()
+            query_cache.set(key=key, generation=generation, value=figure)
+
+        return json.loads(figure)
+
+    @staticmethod
+    def gen_fleet_health_chart(trends: pd.DataFrame, timezone: str) -> go.Figure:
+        """
+        Draw the health trajectories of several models side by side, one WebGL line per model.
+
+        Parameters
+        ----------
+        trends: pd.DataFrame
+            Health per model and time bucket, see `DataServices.get_fleet_trends`.
+        timezone: str
+            Timezone the bucket times are shown in.
+
+        Raises
+        -------
+        ValueError
+            If `trends` is empty.
+        """
+        if trends is None or trends.empty:
+            raise ValueError("No valid data provided.")
+
+        times = pd.to_datetime(trends["log_capture_time"].to_numpy(), unit="s", utc=True)
+        times = times.tz_convert(timezone).tz_localize(None).to_numpy()
+        health = trends["health_snapshots"].to_numpy()
+        counts = trends["snapshot_count"].to_numpy()
+
+        groups = trends.groupby("nickname", sort=False).indices
+        fig = go.Figure(data=[
+            go.Scattergl(
+                x=times[positions],
+                y=health[positions],
+                customdata=counts[positions],
+                name=nickname,
+                mode="lines+markers",
+                marker={"size": 4},
+                line={"width": 1.5},
+                hovertemplate=f"<b>{nickname}</b><br />%{{x}}<br />Health: %{{y}}%<br />Captures: %{{customdata}}<extra></extra>"
+            )
+            for nickname, positions in groups.items()
+        ])
+
+        fig.update_layout(
+            autosize=True,
+            title={"text": f"Battery Health of {len(groups)} Devices Over Time", "x": 0.5},
+            xaxis={"tickangle": 30, "tickmode": "auto", "nticks": 10},
+            yaxis={"title": {"text": "Health (%)"}},
+            showlegend=len(groups) <= FLEET_LEGEND_LIMIT,
+            hovermode="closest",
+            uirevision="fleet"
+        )
+
+        return fig
+
+    def gen_battery_health_chart(self, model: str, timezone: str, data: list[dict[str, str | int]] | pd.DataFrame) -> go.Figure:
         df = self._preprocess(raw=data, target_timezone=timezone)
+        return self._gen_health_figure_from_frame(model=model, df=df)
+
+    def _gen_health_figure_from_frame(self, model: str, df: pd.DataFrame) -> go.Figure:
         if "design_capacity" not in df.columns or not df["design_capacity"].notna().any():
             raise ValueError(f"Cannot find design capacity for model '{model}'. Please ensure hardware data is parsed correctly.")
 
-        last_20df: pd.DataFrame = df.head(20).copy()  # noqa
+        last_20df: pd.DataFrame = df.head(HEALTH_WINDOW_SIZE).copy()  # noqa
         last_20df.loc[:, "avg_cap"] = last_20df.loc[:, self.avg_fields].mean(axis=1)
         avg_cap = float(last_20df.loc[:, "avg_cap"].mean())
         avg_cap = round(avg_cap, 2)
 
         standard_cap = df["design_capacity"].dropna().iloc[0]
+        return self._gen_health_figure(model=model, avg_cap=avg_cap, standard_cap=standard_cap)
+
+    def gen_battery_health_chart_from_summary(self, model: str, summary: dict[str, str | int | float | None]) -> go.Figure:
+        """
+        Same chart as `gen_battery_health_chart`, from the pre-aggregated summary of the model
+        (see `ModelSummary.get_summary`) instead of its raw captures.
+        """
+        avg_cap, standard_cap = summary.get("recent_avg_capacity"), summary.get("recent_design_capacity")
+        if avg_cap is None:
+            raise ValueError("No valid data provided.")
+        if not standard_cap:
+            raise ValueError(f"Cannot find design capacity for model '{model}'. Please ensure hardware data is parsed correctly.")
+
+        return self._gen_health_figure(model=model, avg_cap=avg_cap, standard_cap=standard_cap)
+
+    @staticmethod
+    def _add_projection(fig: go.Figure, projection: dict[str, int | float | None], timezone: str) -> None:
+        """
+        Note under a health figure when the battery is projected to reach end of life,
+        see `DataServices.get_degradation_projection`.
+        """
+        eol_cycle_count, eol_time = projection["end_of_life_cycle_count"], projection["end_of_life_time"]
+        if eol_cycle_count is None and eol_time is None:
+            text = "Capacity is not decreasing, no end of life is projected."
+        else:
+            parts = []
+            if eol_cycle_count is not None:
+                parts.append(f"~{eol_cycle_count} cycles")
+            if eol_time is not None:
+                parts.append(pd.Timestamp(eol_time, unit="s", tz="UTC").tz_convert(timezone).strftime("%Y-%m-%d"))
+            text = f"Projected {projection["end_of_life_health"]}% health at {" / ".join(parts)}"
+
+        fig.add_annotation(text=text, x=0.5, y=-0.05, xref="paper", yref="paper", showarrow=False, font={"size": 12})
+
+    def _gen_health_figure(self, model: str, avg_cap: float, standard_cap: int) -> go.Figure:
         health_data = self._calculate_battery_health(cap_num=avg_cap, model_cap=standard_cap)
 
         fig = go.Figure(
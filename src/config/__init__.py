@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from .database import *
-from .version import APP_VERSION
+from .version import APP_VERSION, PARSER_VERSION
 
 INSTANCE_PATH = Path(__file__).parents[2] / "instance"
 INSTANCE_PATH.mkdir(exist_ok=True)
@@ -16,3 +16,15 @@ ANALYSIS_RESULTS_FIELDS = [
     "phone_brand", "nickname", "system_version", "design_capacity"
 ]
 ANALYSIS_RESULTS_FIELDS.extend(BATTERY_NUMERIC_FIELDS)
+
+# Valid range of battery capacities (mAh), captures outside it are left out of charts and summaries.
+BATTERY_CAPACITY_RANGE = (1000, 15000)
+
+# Number of latest captures averaged to get the current battery health.
+HEALTH_WINDOW_SIZE = 20
+
+# Maximum number of time buckets in the health trajectory of each device of the fleet view.
+FLEET_TREND_POINTS = 200
+
+# Health in percent at which a battery is considered worn out, degradation projections estimate when it is reached.
+END_OF_LIFE_HEALTH = 80
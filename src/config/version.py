@@ -17,3 +17,7 @@ def __get_project_version() -> str:
     return "Unknown"
 
 APP_VERSION = __get_project_version()
+
+# Version of the results of the log parser. Bump it whenever a parser change alters the results of an archive,
+# cached results of other versions are then parsed again.
+PARSER_VERSION = 1
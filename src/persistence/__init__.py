@@ -1 +1,5 @@
-from .analysis_results import AnalysisResults
\ No newline at end of file
+from .analysis_results import AnalysisResults
+from .degradation import DegradationStats
+from .model_summary import ModelSummary
+from .parse_cache import ParseCache
+from .snapshot import BatterySnapshot
\ No newline at end of file
@@ -1,7 +1,53 @@
+import json
+import math
 import sqlite3
+from typing import TYPE_CHECKING
 
-from src.config import ANALYSIS_RESULTS_FIELDS
+from src.config import ANALYSIS_RESULTS_FIELDS, FLEET_TREND_POINTS
 from .connect import BaseStorage
+from .degradation import rebuild_degradation_stats, update_degradation_stats
+from .model_summary import HEALTH_SNAPSHOTS_EXPR, VALID_CAPTURE_EXPR, refresh_model_summary
+from .snapshot import BatterySnapshot
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Operators accepted in the conditions of `get_results_page` and `count_results`.
+CONDITION_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "BETWEEN", "LIKE", "NOT LIKE", "IS NULL", "IS NOT NULL")
+
+# A condition is a (column, operator, value) tuple. Conditions are grouped in clauses:
+# conditions in a clause are joined with OR, clauses are joined with AND.
+type Condition = tuple[str, str, str | int | float | tuple[int | float, int | float] | None]
+type Clause = tuple[Condition, ...]
+
+# Text fields stored as ids of their lookup tables: field -> (id column, lookup table, lookup column).
+DIMENSIONS = {
+    "phone_brand": ("phone_brand_id", "brands", "name"),
+    "nickname": ("model_id", "models", "nickname"),
+    "system_version": ("system_version_id", "system_versions", "name"),
+}
+
+# The id of a model is looked up once per statement, then the model-leading index is walked with it.
+MODEL_ID_EXPR = "(SELECT id FROM models WHERE nickname = ?)"
+
+
+def bump_generation(cur: sqlite3.Cursor) -> int:
+    """
+    Increase the data generation of table **analysis_results**, so that readers caching query results know their
+    entries are stale. Runs on the cursor of the write itself: the new generation is committed with the rows,
+    and a reader never sees new rows with an old generation.
+
+    Returns
+    -------
+    int
+        The new generation.
+    """
+    cur.execute(
+        "INSERT INTO data_generation (table_name, generation) VALUES ('analysis_results', 1) "
+        "ON CONFLICT (table_name) DO UPDATE SET generation = generation + 1 "
+        "RETURNING generation"
+    )
+    return cur.fetchone()[0]
 
 
 class AnalysisResults(BaseStorage):
@@ -11,56 +57,92 @@ class AnalysisResults(BaseStorage):
 
     def init_table(self) -> None:
         """
-        Use a series of SQL statements to initialize table called **analysis_results**.
-        If table exists, its data will be overwritten (drop & create).
-        """
-
-        init_statement = """
-                         DROP TABLE IF EXISTS analysis_results;
-                         CREATE TABLE analysis_results
-                         (
-                             id                            INTEGER PRIMARY KEY AUTOINCREMENT,
-                             log_capture_time              INTEGER NOT NULL,
-                             estimated_battery_capacity    INTEGER NOT NULL,
-                             last_learned_battery_capacity INTEGER NOT NULL,
-                             min_learned_battery_capacity  INTEGER NOT NULL,
-                             max_learned_battery_capacity  INTEGER NOT NULL,
-                             phone_brand                   TEXT    NOT NULL COLLATE BINARY,
-                             nickname                      TEXT    NOT NULL COLLATE BINARY,
-                             system_version                TEXT    NOT NULL COLLATE BINARY,
-                             design_capacity               INTEGER NOT NULL,
-                             cycle_count                   INTEGER NOT NULL,
-                             hardware_capacity             INTEGER NOT NULL
-                         );
-                         CREATE INDEX IF NOT EXISTS idx_log_capture_time
-                             ON analysis_results (log_capture_time);
-                         CREATE UNIQUE INDEX IF NOT EXISTS idx_uni_log
-                             ON analysis_results (log_capture_time, nickname);
-                         """
-
-        with self.conn as c:
+        Empty table **analysis_results**, its lookup tables and its derived tables **model_summary** and
+        **degradation_stats**, keeping their schema and indexes, and bump the data generation.
+        The schema itself is created and upgraded in place by `migrations.migrate`.
+        """
+        with self.writer() as c:
             cur = c.cursor()
-            cur.executescript(init_statement)
+            cur.execute("DELETE FROM analysis_results")
+            cur.execute("DELETE FROM models")
+            cur.execute("DELETE FROM brands")
+            cur.execute("DELETE FROM system_versions")
+            cur.execute("DELETE FROM model_summary")
+            cur.execute("DELETE FROM degradation_stats")
+            bump_generation(cur=cur)
 
-    def save_data(self, data: list[dict[str, str | int]]) -> int:
+    def bulk_load(self, data: list[BatterySnapshot]) -> int:
         """
-        Insert or replace rows of battery analysis results into the table **analysis_results**.
+        Replace all rows of table **analysis_results** as fast as possible.
+
+        The writer connection runs in WAL journal mode with `synchronous=NORMAL`. The table is emptied, its indexes
+        are dropped, the rows are inserted, the indexes are rebuilt from their stored definitions and the derived
+        tables are rebuilt, all in one transaction of the writer connection: the nested writer blocks of
+        `init_table` and `save_data` are savepoints of it, and DDL does not commit it. On any error the whole load
+        is rolled back, leaving the previous rows and indexes untouched.
+        Rows sharing the same (log_capture_time, nickname) are collapsed first, the last one wins,
+        which is what `INSERT OR REPLACE` into the indexed table would do.
 
         Parameters
         ----------
-        data: list[dict[str, str | int]]
-            A list of dictionaries containing keys of `TABLE_FIELDS`.
+        data: list[BatterySnapshot]
+            A list of battery snapshots, see `save_data`.
+
+        Returns
+        -------
+        int
+            The number of rows inserted successfully.
+        """
+        unique_data = list({(item.log_capture_time, item.nickname): item for item in data}.values())
+
+        # One transaction for the whole load, which also keeps any other write from interleaving with it.
+        with self.writer() as c:
+            cur = c.cursor()
+            cur.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'analysis_results' AND sql IS NOT NULL"
+            )
+            indexes = cur.fetchall()
+
+            self.init_table()
+            for name, _ in indexes:
+                cur.execute(f"DROP INDEX {name}")
+
+            counts = self.save_data(data=unique_data, refresh_derived=False)
+
+            for _, sql in indexes:
+                cur.execute(sql)
+
+            # Only once the indexes are back, each model is a few index lookups instead of table scans.
+            refresh_model_summary(cur=cur, nicknames={item.nickname for item in unique_data})
+            rebuild_degradation_stats(cur=cur)
+
+        return counts
+
+    def save_data(self, data: list[BatterySnapshot], refresh_derived: bool = True) -> int:
+        """
+        Insert or replace rows of battery analysis results into the table **analysis_results**, and bump the data
+        generation in the same transaction.
+        Brands, nicknames and system versions are interned into their lookup tables first, rows only store their ids.
+
+        Parameters
+        ----------
+        data: list[BatterySnapshot]
+            A list of battery snapshots.
 
-            - log_capture_time : int
-            - estimated_battery_capacity : int
-            - last_learned_battery_capacity : int
-            - min_learned_battery_capacity : int
-            - max_learned_battery_capacity : int
             - phone_brand : str
             - nickname : str
             - system_version : str
+            - design_capacity : int
+            - log_capture_time : int
             - cycle_count : int
             - hardware_capacity : int
+            - estimated_battery_capacity : int
+            - last_learned_battery_capacity : int
+            - min_learned_battery_capacity : int
+            - max_learned_battery_capacity : int
+        refresh_derived: bool
+            If False, tables **model_summary** and **degradation_stats** are not updated, the caller must rebuild them.
 
         Returns
         -------
@@ -68,28 +150,101 @@ class AnalysisResults(BaseStorage):
             The number of rows inserted successfully.
         """
 
-        fields_str = ", ".join(self.table_field)
-        placeholders_str = ", ".join(["?"] * len(self.table_field))
+        # The text fields lead `TABLE_FIELDS`, they are replaced by the ids of their lookup tables.
+        fields = ["phone_brand_id", "model_id", "system_version_id"] + self.table_field[3:]
+        fields_str = ", ".join(fields)
+        placeholders_str = ", ".join(["?"] * len(fields))
 
         counts = 0
 
-        with self.conn as c:
+        with self.writer() as c:
             cur = c.cursor()
+            brand_ids = self._intern(cur=cur, table="brands", column="name", values={item.phone_brand for item in data})
+            model_ids = self._intern(cur=cur, table="models", column="nickname", values={item.nickname for item in data})
+            version_ids = self._intern(
+                cur=cur, table="system_versions", column="name", values={item.system_version for item in data}
+            )
+
+            if refresh_derived:
+                # Before inserting, as the captures replaced by this batch are subtracted from the statistics.
+                update_degradation_stats(cur=cur, data=data, model_ids=model_ids)
+
             cur.executemany(
                 f"INSERT OR REPLACE INTO analysis_results ({fields_str}) VALUES ({placeholders_str})",
-                [[item[fields] for fields in self.table_field] for item in data]
+                [
+                    (brand_ids[item.phone_brand], model_ids[item.nickname], version_ids[item.system_version], *item[3:])
+                    for item in data
+                ]
             )
 
             counts = cur.rowcount
 
+            if refresh_derived:
+                refresh_model_summary(cur=cur, nicknames=model_ids.keys())
+
+            bump_generation(cur=cur)
+
         return counts
 
+    @staticmethod
+    def _intern(cur: sqlite3.Cursor, table: str, column: str, values: set[str]) -> dict[str, int]:
+        """
+        Insert the values missing from a lookup table, and get the ids of all of them.
+        """
+        cur.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(value, ) for value in values])
+        cur.execute(
+            f"SELECT {column}, id FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(values)), )
+        )
+        return dict(cur.fetchall())
+
+    def get_generation(self) -> int:
+        """
+        Get the data generation of table **analysis_results**, 0 if it has never been written.
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute("SELECT generation FROM data_generation WHERE table_name = 'analysis_results'")
+                row = cur.fetchone()
+
+            return row[0] if row else 0
+        except sqlite3.OperationalError:
+            return 0
+
+    def get_unsaved(self, data: list[BatterySnapshot]) -> list[BatterySnapshot]:
+        """
+        Keep the snapshots whose (nickname, log_capture_time) is not stored in table **analysis_results** yet.
+        Each snapshot costs one lookup on the unique (model_id, log_capture_time) index.
+
+        Returns
+        -------
+        list[BatterySnapshot]
+            The snapshots missing from the table, in their original order.
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute(
+                    "SELECT m.nickname, r.log_capture_time "
+                    "FROM json_each(?) AS j "
+                    "     JOIN models m ON m.nickname = json_extract(j.value, '$[0]') "
+                    "     JOIN analysis_results r ON r.model_id = m.id "
+                    "                            AND r.log_capture_time = json_extract(j.value, '$[1]')",
+                    (json.dumps([(item.nickname, item.log_capture_time) for item in data]), )
+                )
+                saved = {(nickname, log_capture_time) for nickname, log_capture_time in cur.fetchall()}
+
+            return [item for item in data if (item.nickname, item.log_capture_time) not in saved]
+        except sqlite3.OperationalError:
+            return data
+
     def get_unique_model(self) -> list[str] | None:
         try:
             with self.conn as c:
                 c.row_factory = sqlite3.Row
                 cur = c.cursor()
-                cur.execute("SELECT DISTINCT nickname FROM analysis_results")
+                cur.execute("SELECT nickname FROM models ORDER BY nickname")
                 results = [row[0] for row in cur.fetchall()]
 
             return results if results else None
@@ -99,7 +254,7 @@ class AnalysisResults(BaseStorage):
     def get_results(self, model: str | None = None) -> list[dict[str, str | int | float]] | None:
         results = None
 
-        statements = "SELECT * FROM analysis_results"
+        statements = "SELECT * FROM analysis_results_view"
         if model:
             statements += f" WHERE nickname = ?"
         statements += " ORDER BY log_capture_time DESC;"
@@ -108,9 +263,330 @@ class AnalysisResults(BaseStorage):
             with self.conn as c:
                 c.row_factory = sqlite3.Row
                 cur = c.cursor()
-                cur.execute(statements, (model, ) if model else None)
+                cur.execute(statements, (model, ) if model else ())
                 results = [dict(row) for row in cur.fetchall()]
 
             return results if results else None
         except sqlite3.OperationalError:
             return None
+
+    def get_results_frame(
+            self,
+            model: str | None = None,
+            columns: list[str] | None = None,
+            health_snapshots: bool = False
+    ) -> "pd.DataFrame | None":
+        """
+        Get battery analysis results as a DataFrame built straight from the cursor, newest first.
+
+        Parameters
+        ----------
+        model: str or None
+            Nickname of the device model, all models if None.
+        columns: list[str] or None
+            Columns to select, in order. All columns of the table if None.
+        health_snapshots: bool
+            If True, a `health_snapshots` column is computed by SQLite, see `HEALTH_SNAPSHOTS_EXPR`.
+
+        Raises
+        -------
+        ValueError
+            If a column does not exist in the table.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            The results, or None if there are none.
+        """
+        all_columns = ["id"] + self.table_field
+        columns = list(columns) if columns else all_columns
+
+        unknown_columns = [column for column in columns if column not in all_columns]
+        if unknown_columns:
+            raise ValueError(f"Unknown column(s): {", ".join(unknown_columns)}")
+
+        select_list = [self._select_expr(column) for column in columns]
+        if health_snapshots:
+            select_list.append(f"{HEALTH_SNAPSHOTS_EXPR} AS health_snapshots")
+
+        statements = f"SELECT {", ".join(select_list)} FROM analysis_results"
+        if model:
+            statements += f" WHERE model_id = {MODEL_ID_EXPR}"
+        statements += " ORDER BY log_capture_time DESC;"
+
+        return self._fetch_frame(statements=statements, params=(model, ) if model else ())
+
+    def _fetch_frame(self, statements: str, params: tuple | list) -> "pd.DataFrame | None":
+        # pandas is only needed by the web pages, keep it out of the parser worker processes.
+        import pandas as pd
+
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                # Plain tuples, not sqlite3.Row: pandas builds the columns from them directly.
+                cur.row_factory = None
+                cur.execute(statements, params)
+                rows = cur.fetchall()
+                names = [description[0] for description in cur.description]
+
+                # Lookup tables hold a few rows each, they are read whole instead of being joined to every row.
+                lookups = {}
+                for name in names:
+                    if name in DIMENSIONS:
+                        _, table, column = DIMENSIONS[name]
+                        cur.execute(f"SELECT id, {column} FROM {table}")
+                        lookups[name] = dict(cur.fetchall())
+        except sqlite3.OperationalError:
+            return None
+
+        if not rows:
+            return None
+
+        frame = pd.DataFrame.from_records(rows, columns=names)
+        for name, lookup in lookups.items():
+            frame[name] = frame[name].map(lookup)
+
+        return frame
+
+    def _select_expr(self, column: str) -> str:
+        # Ids are selected under the name of their field, and decoded by `_fetch_frame`.
+        if column in DIMENSIONS:
+            return f"{DIMENSIONS[column][0]} AS {column}"
+
+        return column
+
+    def _column_expr(self, column: str) -> str:
+        if column == "health_snapshots":
+            return HEALTH_SNAPSHOTS_EXPR
+
+        if column not in ["id"] + self.table_field:
+            raise ValueError(f"Unknown column: {column}")
+
+        if column in DIMENSIONS:
+            id_column, table, lookup_column = DIMENSIONS[column]
+            return f"(SELECT {lookup_column} FROM {table} WHERE id = {id_column})"
+
+        return column
+
+    def _build_where(
+            self,
+            model: str | None,
+            start_time: int | None,
+            end_time: int | None,
+            conditions: list[Clause] | tuple[Clause, ...] | None
+    ) -> tuple[list[str], list]:
+        """
+        Build the WHERE terms and their parameters shared by `get_results_page` and `count_results`.
+        """
+        terms, params = [], []
+
+        if model:
+            terms.append(f"model_id = {MODEL_ID_EXPR}")
+            params.append(model)
+
+        if start_time is not None:
+            terms.append("log_capture_time >= ?")
+            params.append(start_time)
+
+        if end_time is not None:
+            terms.append("log_capture_time < ?")
+            params.append(end_time)
+
+        for clause in conditions or ():
+            alternatives = []
+            for column, operator, value in clause:
+                if operator not in CONDITION_OPERATORS:
+                    raise ValueError(f"Unknown operator: {operator}")
+
+                expr = self._column_expr(column) if column not in DIMENSIONS else DIMENSIONS[column][2]
+                if operator in ("IS NULL", "IS NOT NULL"):
+                    term = f"{expr} {operator}"
+                elif operator == "BETWEEN":
+                    term = f"{expr} BETWEEN ? AND ?"
+                    params.extend(value)
+                elif operator in ("LIKE", "NOT LIKE"):
+                    term = f"{expr} {operator} ? ESCAPE '\\'"
+                    params.append(value)
+                else:
+                    term = f"{expr} {operator} ?"
+                    params.append(value)
+
+                if column in DIMENSIONS:
+                    # Matched against the few rows of the lookup table, then rows are filtered on the ids found.
+                    id_column, table, _ = DIMENSIONS[column]
+                    term = f"{id_column} IN (SELECT id FROM {table} WHERE {term})"
+
+                alternatives.append(term)
+
+            if alternatives:
+                terms.append(f"({" OR ".join(alternatives)})")
+
+        return terms, params
+
+    def get_results_page(
+            self,
+            model: str | None = None,
+            sort_by: str = "log_capture_time",
+            descending: bool = True,
+            after: tuple[str | int | float, int] | None = None,
+            offset: int = 0,
+            limit: int = 100,
+            start_time: int | None = None,
+            end_time: int | None = None,
+            conditions: list[Clause] | tuple[Clause, ...] | None = None,
+            health_snapshots: bool = False
+    ) -> "pd.DataFrame | None":
+        """
+        Get one page of battery analysis results as a DataFrame, ordered by (`sort_by`, id).
+
+        Pages are read with keyset pagination: `after` is the (`sort_by`, id) key of the last row of
+        the previous page, and the next page starts right after it by walking the index, however deep it is.
+        `offset` is only a fallback for jumping to a page whose previous key is unknown.
+
+        Parameters
+        ----------
+        model: str or None
+            Nickname of the device model, all models if None.
+        sort_by: str
+            Column to order by, a column of the table or `health_snapshots`.
+        descending: bool
+            Whether to order from the largest value, newest first for `log_capture_time`.
+        after: tuple[str | int | float, int] or None
+            Key of the last row of the previous page. None for the first page.
+        offset: int
+            Rows to skip, after `after` if given.
+        limit: int
+            Maximum number of rows of the page.
+        start_time: int or None
+            If given, only rows captured at or after this UNIX timestamp.
+        end_time: int or None
+            If given, only rows captured before this UNIX timestamp.
+        conditions: list[Clause] or None
+            Extra filter, see `Clause`.
+        health_snapshots: bool
+            If True, a `health_snapshots` column is computed by SQLite, see `HEALTH_SNAPSHOTS_EXPR`.
+
+        Raises
+        -------
+        ValueError
+            If a column or an operator is unknown.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            All columns of the page, or None if there are no rows.
+        """
+        sort_expr = self._column_expr(sort_by)
+        terms, params = self._build_where(model=model, start_time=start_time, end_time=end_time, conditions=conditions)
+
+        if after is not None:
+            terms.append(f"({sort_expr}, id) {"<" if descending else ">"} (?, ?)")
+            params.extend(after)
+
+        select_list = [self._select_expr(column) for column in ["id"] + self.table_field]
+        if health_snapshots or sort_by == "health_snapshots":
+            select_list.append(f"{HEALTH_SNAPSHOTS_EXPR} AS health_snapshots")
+
+        direction = "DESC" if descending else "ASC"
+
+        statements = f"SELECT {", ".join(select_list)} FROM analysis_results"
+        if terms:
+            statements += f" WHERE {" AND ".join(terms)}"
+        statements += f" ORDER BY {sort_expr} {direction}, id {direction} LIMIT ? OFFSET ?;"
+
+        return self._fetch_frame(statements=statements, params=params + [limit, offset])
+
+    def count_results(
+            self,
+            model: str | None = None,
+            start_time: int | None = None,
+            end_time: int | None = None,
+            conditions: list[Clause] | tuple[Clause, ...] | None = None
+    ) -> int:
+        """
+        Count the battery analysis results matching the same filter as `get_results_page`.
+        """
+        terms, params = self._build_where(model=model, start_time=start_time, end_time=end_time, conditions=conditions)
+
+        statements = "SELECT COUNT(*) FROM analysis_results"
+        if terms:
+            statements += f" WHERE {" AND ".join(terms)}"
+
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute(statements, params)
+                return cur.fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+    def get_fleet_trends(self, max_points: int = FLEET_TREND_POINTS) -> "pd.DataFrame | None":
+        """
+        Get the health trajectory of every model in one pass over table **analysis_results**:
+        the mean health of the valid captures of each model per time bucket. Health is `HEALTH_SNAPSHOTS_EXPR`
+        without its per-row CASE and rounding, as captures without a design capacity are left out.
+        Buckets are whole days, widened so that the whole time span fits in `max_points` of them.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            Columns `nickname`, `log_capture_time` (start of the bucket, UNIX timestamp), `health_snapshots`
+            and `snapshot_count`, ordered by model and time. None if there are no valid results.
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute("SELECT MIN(log_capture_time), MAX(log_capture_time) FROM analysis_results")
+                first, last = cur.fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+        if first is None:
+            return None
+
+        day = 24 * 60 * 60
+        bucket = day * max(1, math.ceil((last - first + 1) / (day * max_points)))
+
+        return self._fetch_frame(
+            statements=f"""
+                       SELECT model_id AS nickname, log_capture_time / ? * ? AS log_capture_time,
+                              ROUND(AVG(hardware_capacity * 100.0 / design_capacity), 2) AS health_snapshots,
+                              COUNT(*) AS snapshot_count
+                       FROM analysis_results
+                       WHERE design_capacity > 0 AND {VALID_CAPTURE_EXPR}
+                       GROUP BY model_id, log_capture_time / ?
+                       ORDER BY model_id, log_capture_time
+                       """,
+            params=(bucket, bucket, bucket)
+        )
+
+    def get_fleet_stats(self) -> "pd.DataFrame | None":
+        """
+        Get the degradation statistics of every model from table **degradation_stats**, which is kept up to date
+        on every write, so no capture is read. The current health comes from table **model_summary**.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            One row per model, None if there are no valid results.
+
+            - nickname, latest_cycle_count
+            - valid_count, sum_x, sum_y, sum_xx, sum_xy : sums of a least-squares fit of the hardware capacity (y)
+              of the valid captures against their cycle count (x)
+            - recent_design_capacity : design capacity of the latest valid capture
+            - current_health : mean capacity of the last `HEALTH_WINDOW_SIZE` valid captures over their
+              design capacity, in percent
+        """
+        return self._fetch_frame(
+            statements="""
+                       SELECT m.id AS nickname, s.latest_cycle_count, d.n AS valid_count, d.sum_c AS sum_x,
+                              d.sum_y, d.sum_cc AS sum_xx, d.sum_cy AS sum_xy, s.recent_design_capacity,
+                              ROUND(s.recent_avg_capacity * 100.0 / s.recent_design_capacity, 2) AS current_health
+                       FROM degradation_stats d
+                            JOIN models m ON m.id = d.model_id
+                            LEFT JOIN model_summary s ON s.nickname = m.nickname
+                       WHERE d.n > 0
+                       ORDER BY m.nickname
+                       """,
+            params=()
+        )
@@ -1,15 +1,163 @@
+import atexit
 import sqlite3
+import threading
+from contextlib import AbstractContextManager, contextmanager
+from pathlib import Path
+from typing import Iterator
 
 from src.config import DB_PATH
+from .migrations import migrate
+
+
+class ConnectionPool:
+    """
+    Process-wide SQLite connections: one read connection per thread, reused across requests,
+    and a single writer connection shared by every thread and serialized by a lock.
+    The database runs in WAL mode, so readers never block the writer and vice versa.
+    """
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+
+        self._readers: dict[int, sqlite3.Connection] = {}
+        self._writer: sqlite3.Connection | None = None
+        self._readers_lock = threading.Lock()
+        self._writer_lock = threading.RLock()
+        # Number of open writer blocks of the thread holding the lock.
+        self._writer_depth = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are only ever used by one thread at a time, but may be closed from another one.
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        # Transactions of the writer are opened explicitly, so DDL never commits an open transaction behind its back.
+        if self._writer is None:
+            self._writer = self._connect()
+            self._writer.isolation_level = None
+            self._writer.execute("PRAGMA journal_mode = WAL")
+            self._writer.execute("PRAGMA synchronous = NORMAL")
+
+        return self._writer
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Get the read connection of the current thread, creating it on first use.
+        Connections of threads that have exited are closed at the same time.
+        """
+        ident = threading.get_ident()
+
+        with self._readers_lock:
+            conn = self._readers.get(ident)
+            if conn is not None:
+                return conn
+
+            alive = {thread.ident for thread in threading.enumerate()}
+            for dead in [i for i in self._readers if i not in alive]:
+                self._readers.pop(dead).close()
+
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._readers[ident] = conn
+            return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hold the writer connection for the duration of the block. The outermost block runs in one transaction,
+        committed on success and rolled back on error. Nested blocks of the same thread run inside that transaction
+        as savepoints: an error rolls back only the work of the nested block, and nothing is committed
+        before the outermost block exits.
+        """
+        with self._writer_lock:
+            conn = self._writer_connection()
+            depth = self._writer_depth
+
+            if depth == 0:
+                conn.execute("BEGIN IMMEDIATE")
+            else:
+                conn.execute(f"SAVEPOINT writer_{depth}")
+
+            self._writer_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._writer_depth -= 1
+                # SQLite may already have rolled the whole transaction back on its own, e.g. on a full disk.
+                if conn.in_transaction:
+                    if depth == 0:
+                        conn.execute("ROLLBACK")
+                    else:
+                        conn.execute(f"ROLLBACK TO writer_{depth}")
+                        conn.execute(f"RELEASE writer_{depth}")
+                raise
+
+            self._writer_depth -= 1
+            if depth == 0:
+                conn.execute("COMMIT")
+            else:
+                conn.execute(f"RELEASE writer_{depth}")
+
+    def migrate(self) -> int:
+        """
+        Bring the database schema up to date through the writer connection, one transaction per migration.
+
+        Returns
+        -------
+        int
+            The schema version of the database before migrating.
+        """
+        with self._writer_lock:
+            if self._writer_depth:
+                raise RuntimeError("The database cannot be migrated inside a writer block.")
+
+            return migrate(self._writer_connection())
+
+    def close(self) -> None:
+        with self._writer_lock, self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_connection_pool: ConnectionPool | None = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Get the connection pool of the current process, creating it on first use.
+    The database schema is migrated to the current version at the same time.
+    """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            pool = ConnectionPool(DB_PATH)
+            pool.migrate()
+
+            _connection_pool = pool
+            atexit.register(_connection_pool.close)
+
+    return _connection_pool
 
 
 class BaseStorage:
     def __init__(self) -> None:
-        DB_PATH.parent.mkdir(exist_ok=True)
-        self.conn = sqlite3.connect(DB_PATH)
+        self.pool = get_connection_pool()
 
-    def close(self) -> None:
-        self.conn.close()
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        Read connection of the current thread.
+        """
+        return self.pool.reader()
 
-    def __del__(self) -> None:
-        self.close()
\ No newline at end of file
+    def writer(self) -> AbstractContextManager[sqlite3.Connection]:
+        """
+        Context manager holding the serialized writer connection in one transaction, or a savepoint if nested.
+        """
+        return self.pool.writer()
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+from typing import Iterable
+
+from src.config import BATTERY_CAPACITY_RANGE
+from .connect import BaseStorage
+from .model_summary import CAPACITY_FIELDS, VALID_CAPTURE_EXPR
+from .snapshot import BatterySnapshot
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Sufficient statistics of two least-squares fits of the hardware capacity (y) of the valid captures of a model:
+# against cycle count (c), and against capture time (t, in days since the UNIX epoch).
+DEGRADATION_STATS_FIELDS = ["n", "sum_c", "sum_cc", "sum_t", "sum_tt", "sum_y", "sum_cy", "sum_ty"]
+
+# The statistics of one capture, in the order of `DEGRADATION_STATS_FIELDS`, as SQL over a row of analysis_results.
+_DAYS = f"(log_capture_time / {float(SECONDS_PER_DAY)})"
+DEGRADATION_TERMS = [
+    "1", "cycle_count", "cycle_count * cycle_count", _DAYS, f"{_DAYS} * {_DAYS}",
+    "hardware_capacity", "cycle_count * hardware_capacity", f"{_DAYS} * hardware_capacity"
+]
+
+
+def _terms(item: BatterySnapshot) -> tuple[int | float, ...]:
+    # Same as `DEGRADATION_TERMS`, for a capture that is not in the table yet.
+    c, t, y = item.cycle_count, item.log_capture_time / SECONDS_PER_DAY, item.hardware_capacity
+    return 1, c, c * c, t, t * t, y, c * y, t * y
+
+
+def _is_valid(item: BatterySnapshot) -> bool:
+    # Same filter as `VALID_CAPTURE_EXPR`.
+    return all(
+        BATTERY_CAPACITY_RANGE[0] <= getattr(item, field) <= BATTERY_CAPACITY_RANGE[1] for field in CAPACITY_FIELDS
+    )
+
+
+def update_degradation_stats(cur: sqlite3.Cursor, data: Iterable[BatterySnapshot], model_ids: dict[str, int]) -> None:
+    """
+    Add the captures about to be inserted to table **degradation_stats**, in O(1) per capture.
+    Must run in the writing transaction, before the captures are inserted: captures they replace
+    (same model and capture time) are looked up and subtracted, so replacing a capture does not count it twice.
+
+    Parameters
+    ----------
+    cur: sqlite3.Cursor
+        Cursor of the writing transaction.
+    data: Iterable[BatterySnapshot]
+        Captures about to be inserted or replaced.
+    model_ids: dict[str, int]
+        Ids of the nicknames of the captures, see `AnalysisResults._intern`.
+    """
+    # With duplicate keys in one batch, the last capture is the one left in the table.
+    captures = {(model_ids[item.nickname], item.log_capture_time): item for item in data}
+
+    deltas: dict[int, list[int | float]] = {}
+    for (model_id, _), item in captures.items():
+        if _is_valid(item):
+            delta = deltas.setdefault(model_id, [0] * len(DEGRADATION_STATS_FIELDS))
+            for index, term in enumerate(_terms(item)):
+                delta[index] += term
+
+    # One lookup on the unique (model_id, log_capture_time) index per capture.
+    cur.execute(
+        f"SELECT model_id, {", ".join(DEGRADATION_TERMS)} "
+        "FROM json_each(?) AS j "
+        "     JOIN analysis_results ON model_id = json_extract(j.value, '$[0]') "
+        "                          AND log_capture_time = json_extract(j.value, '$[1]') "
+        f"WHERE {VALID_CAPTURE_EXPR}",
+        (json.dumps(list(captures.keys())), )
+    )
+    for model_id, *terms in cur.fetchall():
+        delta = deltas.setdefault(model_id, [0] * len(DEGRADATION_STATS_FIELDS))
+        for index, term in enumerate(terms):
+            delta[index] -= term
+
+    fields_str = ", ".join(DEGRADATION_STATS_FIELDS)
+    cur.executemany(
+        f"INSERT INTO degradation_stats (model_id, {fields_str}) "
+        f"VALUES (?, {", ".join(["?"] * len(DEGRADATION_STATS_FIELDS))}) "
+        f"ON CONFLICT (model_id) DO UPDATE SET "
+        f"{", ".join(f"{field} = {field} + excluded.{field}" for field in DEGRADATION_STATS_FIELDS)}",
+        [(model_id, *delta) for model_id, delta in deltas.items()]
+    )
+
+
+def rebuild_degradation_stats(cur: sqlite3.Cursor) -> None:
+    """
+    Recompute table **degradation_stats** from all valid captures of table **analysis_results**, in one pass.
+
+    Parameters
+    ----------
+    cur: sqlite3.Cursor
+        Cursor of the writing transaction.
+    """
+    fields_str = ", ".join(DEGRADATION_STATS_FIELDS)
+    sums_str = ", ".join(f"SUM({term})" for term in DEGRADATION_TERMS)
+
+    cur.execute("DELETE FROM degradation_stats")
+    cur.execute(
+        f"INSERT INTO degradation_stats (model_id, {fields_str}) "
+        f"SELECT model_id, {sums_str} FROM analysis_results WHERE {VALID_CAPTURE_EXPR} GROUP BY model_id"
+    )
+
+
+class DegradationStats(BaseStorage):
+    def get_stats(self, nickname: str) -> dict[str, int | float | None] | None:
+        """
+        Get the degradation statistics of a model, together with the design capacity of its latest valid capture.
+
+        Returns
+        -------
+        dict[str, int | float | None] or None
+            A dictionary containing keys of `DEGRADATION_STATS_FIELDS` and `recent_design_capacity`,
+            or None if the model has no valid captures.
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute(
+                    f"SELECT {", ".join(f"d.{field}" for field in DEGRADATION_STATS_FIELDS)}, s.recent_design_capacity "
+                    "FROM models m "
+                    "     JOIN degradation_stats d ON d.model_id = m.id "
+                    "     LEFT JOIN model_summary s ON s.nickname = m.nickname "
+                    "WHERE m.nickname = ?",
+                    (nickname, )
+                )
+                row = cur.fetchone()
+
+            return dict(row) if row and row["n"] > 0 else None
+        except sqlite3.OperationalError:
+            return None
@@ -0,0 +1,294 @@
+import sqlite3
+from typing import Callable
+
+type Migration = Callable[[sqlite3.Cursor], None]
+
+
+def add_column(cur: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    """
+    Add a column to a table in place, unless it already exists.
+
+    Parameters
+    ----------
+    cur: sqlite3.Cursor
+        Cursor of the migration transaction.
+    table: str
+        Name of the table.
+    column: str
+        Name of the new column.
+    definition: str
+        Type and constraints of the column, e.g. `INTEGER NOT NULL DEFAULT 0`.
+    """
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _create_analysis_results(cur: sqlite3.Cursor) -> None:
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_results
+                (
+                    id                            INTEGER PRIMARY KEY AUTOINCREMENT,
+                    log_capture_time              INTEGER NOT NULL,
+                    estimated_battery_capacity    INTEGER NOT NULL,
+                    last_learned_battery_capacity INTEGER NOT NULL,
+                    min_learned_battery_capacity  INTEGER NOT NULL,
+                    max_learned_battery_capacity  INTEGER NOT NULL,
+                    phone_brand                   TEXT    NOT NULL COLLATE BINARY,
+                    nickname                      TEXT    NOT NULL COLLATE BINARY,
+                    system_version                TEXT    NOT NULL COLLATE BINARY,
+                    design_capacity               INTEGER NOT NULL,
+                    cycle_count                   INTEGER NOT NULL,
+                    hardware_capacity             INTEGER NOT NULL
+                )
+                """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_log_capture_time ON analysis_results (log_capture_time)")
+
+
+def _add_models(cur: sqlite3.Cursor) -> None:
+    # The unique index leads with nickname, so per-model reads ordered by capture time walk the index.
+    cur.execute("DROP INDEX IF EXISTS idx_uni_log")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_uni_model_log ON analysis_results (nickname, log_capture_time)")
+
+    cur.execute("CREATE TABLE IF NOT EXISTS models (nickname TEXT PRIMARY KEY COLLATE BINARY) WITHOUT ROWID")
+    cur.execute("INSERT OR IGNORE INTO models (nickname) SELECT DISTINCT nickname FROM analysis_results")
+
+
+def _create_data_generation(cur: sqlite3.Cursor) -> None:
+    cur.execute("CREATE TABLE IF NOT EXISTS data_generation (table_name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+
+
+def _create_parse_cache(cur: sqlite3.Cursor) -> None:
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS parse_cache
+                (
+                    file_hash  TEXT    PRIMARY KEY,
+                    file_name  TEXT    NOT NULL COLLATE BINARY,
+                    file_size  INTEGER NOT NULL,
+                    file_mtime INTEGER NOT NULL,
+                    record     TEXT    NOT NULL
+                )
+                """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_cache_stat ON parse_cache (file_name, file_size, file_mtime)")
+
+
+def _create_model_summary(cur: sqlite3.Cursor) -> None:
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS model_summary
+                (
+                    nickname                TEXT    PRIMARY KEY COLLATE BINARY,
+                    snapshot_count          INTEGER NOT NULL,
+                    latest_capture_time     INTEGER NOT NULL,
+                    latest_cycle_count      INTEGER NOT NULL,
+                    latest_design_capacity  INTEGER NOT NULL,
+                    latest_health_snapshots REAL    NOT NULL,
+                    valid_count             INTEGER NOT NULL,
+                    recent_avg_capacity     REAL,
+                    recent_design_capacity  INTEGER,
+                    min_capacity            INTEGER,
+                    max_capacity            INTEGER
+                ) WITHOUT ROWID
+                """)
+
+    # Frozen copy of the summary of the application at this version, so later changes to it cannot change this step.
+    # Valid captures have every capacity in [1000, 15000], the recent average covers the latest 20 of them.
+    cur.execute("""
+                INSERT OR REPLACE INTO model_summary
+                WITH captures AS (SELECT *,
+                                         ROW_NUMBER() OVER (PARTITION BY nickname, is_valid
+                                                            ORDER BY log_capture_time DESC) AS valid_rank,
+                                         ROW_NUMBER() OVER (PARTITION BY nickname
+                                                            ORDER BY log_capture_time DESC) AS latest_rank
+                                  FROM (SELECT nickname, log_capture_time, cycle_count, design_capacity,
+                                               ROUND(CASE WHEN design_capacity > 0
+                                                          THEN hardware_capacity * 100.0 / design_capacity
+                                                          ELSE 0.0 END, 2) AS health_snapshots,
+                                               (last_learned_battery_capacity + min_learned_battery_capacity +
+                                                max_learned_battery_capacity + hardware_capacity) / 4.0
+                                                   AS avg_capacity,
+                                               MIN(estimated_battery_capacity, last_learned_battery_capacity,
+                                                   min_learned_battery_capacity, max_learned_battery_capacity,
+                                                   hardware_capacity) AS min_capacity,
+                                               MAX(estimated_battery_capacity, last_learned_battery_capacity,
+                                                   min_learned_battery_capacity, max_learned_battery_capacity,
+                                                   hardware_capacity) AS max_capacity,
+                                               (estimated_battery_capacity BETWEEN 1000 AND 15000 AND
+                                                last_learned_battery_capacity BETWEEN 1000 AND 15000 AND
+                                                min_learned_battery_capacity BETWEEN 1000 AND 15000 AND
+                                                max_learned_battery_capacity BETWEEN 1000 AND 15000 AND
+                                                hardware_capacity BETWEEN 1000 AND 15000) AS is_valid
+                                        FROM analysis_results))
+                SELECT nickname,
+                       COUNT(*),
+                       MAX(CASE WHEN latest_rank = 1 THEN log_capture_time END),
+                       MAX(CASE WHEN latest_rank = 1 THEN cycle_count END),
+                       MAX(CASE WHEN latest_rank = 1 THEN design_capacity END),
+                       MAX(CASE WHEN latest_rank = 1 THEN health_snapshots END),
+                       SUM(is_valid),
+                       ROUND(AVG(CASE WHEN is_valid AND valid_rank <= 20 THEN avg_capacity END), 2),
+                       MAX(CASE WHEN is_valid AND valid_rank = 1 THEN design_capacity END),
+                       MIN(CASE WHEN is_valid THEN min_capacity END),
+                       MAX(CASE WHEN is_valid THEN max_capacity END)
+                FROM captures
+                GROUP BY nickname
+                """)
+
+
+def _intern_dimensions(cur: sqlite3.Cursor) -> None:
+    # Brand, model and system version are stored once in lookup tables, results refer to them by integer id.
+    cur.execute("CREATE TABLE IF NOT EXISTS brands (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE COLLATE BINARY)")
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS system_versions (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE COLLATE BINARY)"
+    )
+    cur.execute("CREATE TABLE models_new (id INTEGER PRIMARY KEY, nickname TEXT NOT NULL UNIQUE COLLATE BINARY)")
+
+    cur.execute("INSERT OR IGNORE INTO brands (name) SELECT DISTINCT phone_brand FROM analysis_results")
+    cur.execute("INSERT OR IGNORE INTO system_versions (name) SELECT DISTINCT system_version FROM analysis_results")
+    cur.execute("INSERT OR IGNORE INTO models_new (nickname) SELECT nickname FROM models")
+
+    cur.execute("""
+                CREATE TABLE analysis_results_new
+                (
+                    id                            INTEGER PRIMARY KEY AUTOINCREMENT,
+                    log_capture_time              INTEGER NOT NULL,
+                    estimated_battery_capacity    INTEGER NOT NULL,
+                    last_learned_battery_capacity INTEGER NOT NULL,
+                    min_learned_battery_capacity  INTEGER NOT NULL,
+                    max_learned_battery_capacity  INTEGER NOT NULL,
+                    phone_brand_id                INTEGER NOT NULL REFERENCES brands (id),
+                    model_id                      INTEGER NOT NULL REFERENCES models (id),
+                    system_version_id             INTEGER NOT NULL REFERENCES system_versions (id),
+                    design_capacity               INTEGER NOT NULL,
+                    cycle_count                   INTEGER NOT NULL,
+                    hardware_capacity             INTEGER NOT NULL
+                )
+                """)
+    cur.execute("""
+                INSERT INTO analysis_results_new
+                SELECT r.id, r.log_capture_time, r.estimated_battery_capacity, r.last_learned_battery_capacity,
+                       r.min_learned_battery_capacity, r.max_learned_battery_capacity, b.id, m.id, v.id,
+                       r.design_capacity, r.cycle_count, r.hardware_capacity
+                FROM analysis_results r
+                     JOIN brands b ON b.name = r.phone_brand
+                     JOIN models_new m ON m.nickname = r.nickname
+                     JOIN system_versions v ON v.name = r.system_version
+                """)
+
+    cur.execute("DROP TABLE analysis_results")
+    cur.execute("DROP TABLE models")
+    cur.execute("ALTER TABLE analysis_results_new RENAME TO analysis_results")
+    cur.execute("ALTER TABLE models_new RENAME TO models")
+
+    cur.execute("CREATE INDEX idx_log_capture_time ON analysis_results (log_capture_time)")
+    cur.execute("CREATE UNIQUE INDEX idx_uni_model_log ON analysis_results (model_id, log_capture_time)")
+
+    # Rows with the ids decoded back into the original columns, for reads that want whole rows as they were.
+    cur.execute("""
+                CREATE VIEW analysis_results_view AS
+                SELECT r.id, b.name AS phone_brand, m.nickname, v.name AS system_version, r.design_capacity,
+                       r.log_capture_time, r.cycle_count, r.hardware_capacity, r.estimated_battery_capacity,
+                       r.last_learned_battery_capacity, r.min_learned_battery_capacity,
+                       r.max_learned_battery_capacity
+                FROM analysis_results r
+                     JOIN models m ON m.id = r.model_id
+                     JOIN brands b ON b.id = r.phone_brand_id
+                     JOIN system_versions v ON v.id = r.system_version_id
+                """)
+
+    # Table model_summary is still keyed by nickname and its content does not change.
+
+
+def _create_degradation_stats(cur: sqlite3.Cursor) -> None:
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS degradation_stats
+                (
+                    model_id INTEGER PRIMARY KEY REFERENCES models (id),
+                    n        INTEGER NOT NULL,
+                    sum_c    INTEGER NOT NULL,
+                    sum_cc   INTEGER NOT NULL,
+                    sum_t    REAL    NOT NULL,
+                    sum_tt   REAL    NOT NULL,
+                    sum_y    INTEGER NOT NULL,
+                    sum_cy   INTEGER NOT NULL,
+                    sum_ty   REAL    NOT NULL
+                )
+                """)
+
+    # Frozen copy of `rebuild_degradation_stats` at this version, t is in days since the UNIX epoch.
+    cur.execute("""
+                INSERT INTO degradation_stats (model_id, n, sum_c, sum_cc, sum_t, sum_tt, sum_y, sum_cy, sum_ty)
+                SELECT model_id, COUNT(*), SUM(cycle_count), SUM(cycle_count * cycle_count),
+                       SUM(log_capture_time / 86400.0), SUM((log_capture_time / 86400.0) * (log_capture_time / 86400.0)),
+                       SUM(hardware_capacity), SUM(cycle_count * hardware_capacity),
+                       SUM((log_capture_time / 86400.0) * hardware_capacity)
+                FROM analysis_results
+                WHERE estimated_battery_capacity BETWEEN 1000 AND 15000
+                  AND last_learned_battery_capacity BETWEEN 1000 AND 15000
+                  AND min_learned_battery_capacity BETWEEN 1000 AND 15000
+                  AND max_learned_battery_capacity BETWEEN 1000 AND 15000
+                  AND hardware_capacity BETWEEN 1000 AND 15000
+                GROUP BY model_id
+                """)
+
+
+def _add_parser_version(cur: sqlite3.Cursor) -> None:
+    # Results cached before the parser was versioned are at version 0, so they are all parsed again.
+    add_column(cur=cur, table="parse_cache", column="parser_version", definition="INTEGER NOT NULL DEFAULT 0")
+
+
+# Schema version N is reached by applying the first N migrations, in order. Only ever append to this list,
+# and never change a migration that has shipped: it must not depend on application code that may change later.
+# Databases created before versioning are at version 0, so the first migrations must accept existing objects.
+MIGRATIONS: list[Migration] = [
+    _create_analysis_results,
+    _add_models,
+    _create_data_generation,
+    _create_parse_cache,
+    _create_model_summary,
+    _intern_dimensions,
+    _create_degradation_stats,
+    _add_parser_version,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database schema up to `SCHEMA_VERSION` in place, keeping its data.
+    Each pending migration runs in its own transaction together with the update of `PRAGMA user_version`,
+    so an interrupted run resumes from the last completed migration.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        A writer connection in autocommit mode (`isolation_level = None`), not in a transaction.
+
+    Raises
+    -------
+    RuntimeError
+        If the database was created by a newer version of the application.
+
+    Returns
+    -------
+    int
+        The schema version of the database before migrating.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than supported version {SCHEMA_VERSION}.")
+
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {target}")
+        except BaseException:
+            if conn.in_transaction:
+                cur.execute("ROLLBACK")
+            raise
+
+        cur.execute("COMMIT")
+
+    return version
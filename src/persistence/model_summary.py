@@ -0,0 +1,114 @@
+import sqlite3
+from typing import Iterable
+
+from src.config import BATTERY_CAPACITY_RANGE, BATTERY_CAPACITY_TYPES, HEALTH_WINDOW_SIZE
+from .connect import BaseStorage
+
+CAPACITY_FIELDS = BATTERY_CAPACITY_TYPES + ["hardware_capacity"]
+AVERAGE_FIELDS = [field for field in CAPACITY_FIELDS if field != "estimated_battery_capacity"]
+
+# Health of each snapshot in percent: hardware capacity over design capacity, 0 if the design capacity is unknown.
+HEALTH_SNAPSHOTS_EXPR = (
+    "ROUND(CASE WHEN design_capacity > 0 THEN hardware_capacity * 100.0 / design_capacity ELSE 0.0 END, 2)"
+)
+
+# Same filter as `Visualizer._preprocess`: every capacity must be in `BATTERY_CAPACITY_RANGE`.
+VALID_CAPTURE_EXPR = " AND ".join(
+    f"{field} BETWEEN {BATTERY_CAPACITY_RANGE[0]} AND {BATTERY_CAPACITY_RANGE[1]}" for field in CAPACITY_FIELDS
+)
+
+MODEL_SUMMARY_FIELDS = [
+    "nickname", "snapshot_count", "latest_capture_time", "latest_cycle_count", "latest_design_capacity",
+    "latest_health_snapshots", "valid_count", "recent_avg_capacity", "recent_design_capacity",
+    "min_capacity", "max_capacity"
+]
+
+
+def refresh_model_summary(cur: sqlite3.Cursor, nicknames: Iterable[str]) -> None:
+    """
+    Recompute the rows of table **model_summary** for the given nicknames from **analysis_results**.
+    Each model costs a few lookups on its model-leading index, so it is cheap enough to run on every write.
+
+    Parameters
+    ----------
+    cur: sqlite3.Cursor
+        Cursor of the writing transaction.
+    nicknames: Iterable[str]
+        Nicknames whose results were written.
+    """
+    avg_expr = f"({" + ".join(AVERAGE_FIELDS)}) / {float(len(AVERAGE_FIELDS))}"
+
+    for nickname in nicknames:
+        cur.execute("SELECT id FROM models WHERE nickname = ?", (nickname, ))
+        model = cur.fetchone()
+
+        latest = None
+        if model is not None:
+            model_id = model[0]
+            cur.execute(
+                f"SELECT log_capture_time, cycle_count, design_capacity, {HEALTH_SNAPSHOTS_EXPR} "
+                "FROM analysis_results WHERE model_id = ? ORDER BY log_capture_time DESC LIMIT 1",
+                (model_id, )
+            )
+            latest = cur.fetchone()
+
+        if latest is None:
+            cur.execute("DELETE FROM model_summary WHERE nickname = ?", (nickname, ))
+            continue
+
+        cur.execute("SELECT COUNT(*) FROM analysis_results WHERE model_id = ?", (model_id, ))
+        snapshot_count = cur.fetchone()[0]
+
+        cur.execute(
+            f"SELECT COUNT(*), MIN(MIN({", ".join(CAPACITY_FIELDS)})), MAX(MAX({", ".join(CAPACITY_FIELDS)})) "
+            f"FROM analysis_results WHERE model_id = ? AND {VALID_CAPTURE_EXPR}",
+            (model_id, )
+        )
+        valid_count, min_capacity, max_capacity = cur.fetchone()
+
+        cur.execute(
+            f"SELECT ROUND(AVG(avg_capacity), 2), "
+            "(SELECT design_capacity FROM analysis_results "
+            f" WHERE model_id = ? AND {VALID_CAPTURE_EXPR} ORDER BY log_capture_time DESC LIMIT 1) "
+            f"FROM (SELECT {avg_expr} AS avg_capacity FROM analysis_results "
+            f"      WHERE model_id = ? AND {VALID_CAPTURE_EXPR} ORDER BY log_capture_time DESC LIMIT ?)",
+            (model_id, model_id, HEALTH_WINDOW_SIZE)
+        )
+        recent_avg_capacity, recent_design_capacity = cur.fetchone()
+
+        cur.execute(
+            f"INSERT OR REPLACE INTO model_summary ({", ".join(MODEL_SUMMARY_FIELDS)}) "
+            f"VALUES ({", ".join(["?"] * len(MODEL_SUMMARY_FIELDS))})",
+            (nickname, snapshot_count, *latest, valid_count, recent_avg_capacity, recent_design_capacity,
+             min_capacity, max_capacity)
+        )
+
+
+class ModelSummary(BaseStorage):
+    def get_summary(self, nickname: str) -> dict[str, str | int | float | None] | None:
+        """
+        Get the summary of a model: its latest capture, and statistics over its valid captures.
+
+        Returns
+        -------
+        dict[str, str | int | float | None] or None
+            A dictionary containing keys of `MODEL_SUMMARY_FIELDS`, or None if the model has no results.
+
+            - latest_* : fields of the latest capture, valid or not
+            - recent_avg_capacity : mean capacity of the last `HEALTH_WINDOW_SIZE` valid captures,
+              None if there are none
+            - recent_design_capacity : design capacity of the latest valid capture
+            - min_capacity, max_capacity : range of the capacities of all valid captures
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute(
+                    f"SELECT {", ".join(MODEL_SUMMARY_FIELDS)} FROM model_summary WHERE nickname = ?",
+                    (nickname, )
+                )
+                row = cur.fetchone()
+
+            return dict(row) if row else None
+        except sqlite3.OperationalError:
+            return None
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+from src.config import PARSER_VERSION
+from .connect import BaseStorage
+from .snapshot import BatterySnapshot
+
+
+def _load_record(row: tuple[str] | None) -> tuple[bool, BatterySnapshot | None]:
+    if row is None:
+        return False, None
+
+    data = json.loads(row[0])
+    return True, BatterySnapshot.from_dict(data) if data is not None else None
+
+
+class ParseCache(BaseStorage):
+    """
+    Parsed results of archives, keyed by their content hash.
+    Archives without battery information are cached too, with a JSON `null` record, so they are not parsed again either.
+    """
+    @staticmethod
+    def file_digest(path: str | Path) -> str:
+        """
+        Calculate the SHA-256 content hash of a file.
+
+        Parameters
+        ----------
+        path: str or Path
+            Path of the file.
+
+        Returns
+        -------
+        str
+            Hex digest of the file content.
+        """
+        with open(path, mode="rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    def get_by_stat(self, name: str, size: int, mtime: int) -> tuple[bool, BatterySnapshot | None]:
+        """
+        Look up a cached result by the file name, size and modification time of an archive.
+        Only results of the current `PARSER_VERSION` are returned.
+
+        Returns
+        -------
+        tuple[bool, BatterySnapshot or None]
+            Whether the archive is cached, and its battery information, None if it has none.
+        """
+        try:
+            with self.conn as c:
+                cur = c.cursor()
+                cur.execute(
+                    "SELECT record FROM parse_cache "
+                    "WHERE file_name = ? AND file_size = ? AND file_mtime = ? AND parser_version = ? LIMIT 1",
+                    (name, size, mtime, PARSER_VERSION)
+                )
+                row = cur.fetchone()
+
+            return _load_record(row=row)
+        except sqlite3.OperationalError:
+            return False, None
+
+    def get_by_hash(self, file_hash: str, name: str, size: int, mtime: int) -> tuple[bool, BatterySnapshot | None]:
+        """
+        Look up a cached result by the content hash of an archive.
+        Only results of the current `PARSER_VERSION` are returned.
+        On a hit, the stored name, size and modification time are refreshed so the next lookup can use `get_by_stat`.
+
+        Returns
+        -------
+        tuple[bool, BatterySnapshot or None]
+            Whether the archive is cached, and its battery information, None if it has none.
+        """
+        try:
+            with self.writer() as c:
+                cur = c.cursor()
+                cur.execute(
+                    "SELECT record FROM parse_cache WHERE file_hash = ? AND parser_version = ?",
+                    (file_hash, PARSER_VERSION)
+                )
+                row = cur.fetchone()
+                if row:
+                    cur.execute(
+                        "UPDATE parse_cache SET file_name = ?, file_size = ?, file_mtime = ? WHERE file_hash = ?",
+                        (name, size, mtime, file_hash)
+                    )
+
+            return _load_record(row=row)
+        except sqlite3.OperationalError:
+            return False, None
+
+    def save_data(self, data: list[tuple[str, str, int, int, BatterySnapshot | None]]) -> int:
+        """
+        Insert or replace parsed results into the table **parse_cache**, tagged with the current `PARSER_VERSION`.
+
+        Parameters
+        ----------
+        data: list[tuple[str, str, int, int, BatterySnapshot | None]]
+            A list of (file_hash, file_name, file_size, file_mtime, battery information) tuples.
+            The battery information is None for archives in which the parser found none.
+
+        Returns
+        -------
+        int
+            The number of rows inserted successfully.
+        """
+        with self.writer() as c:
+            cur = c.cursor()
+            cur.executemany(
+                "INSERT OR REPLACE INTO parse_cache "
+                "(file_hash, file_name, file_size, file_mtime, record, parser_version) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (file_hash, name, size, mtime, json.dumps(record._asdict() if record is not None else None), PARSER_VERSION)
+                    for file_hash, name, size, mtime, record in data
+                ]
+            )
+
+            counts = cur.rowcount
+
+        return counts
@@ -0,0 +1,41 @@
+from operator import itemgetter
+from typing import NamedTuple, Self
+
+from src.config import ANALYSIS_RESULTS_FIELDS
+
+
+class BatterySnapshot(NamedTuple):
+    """
+    Battery information parsed from one bugreport.
+    Fields follow the order of `ANALYSIS_RESULTS_FIELDS`, so a snapshot is a row of **analysis_results** as is:
+    it is validated and inserted without being looked up by field name.
+    Parser workers send plain tuples back instead, which pickle faster, and the parent rebuilds them with `_make`.
+    """
+    phone_brand: str
+    nickname: str
+    system_version: str
+    design_capacity: int
+    log_capture_time: int
+    cycle_count: int
+    hardware_capacity: int
+    estimated_battery_capacity: int
+    last_learned_battery_capacity: int
+    min_learned_battery_capacity: int
+    max_learned_battery_capacity: int
+
+    @classmethod
+    def from_dict(cls, data: dict[str, str | int]) -> Self:
+        """
+        Build a snapshot from a dictionary containing keys of `ANALYSIS_RESULTS_FIELDS`, other keys are ignored.
+
+        Raises
+        -------
+        KeyError
+            If a field is missing.
+        """
+        return cls._make(_fields_getter(data))
+
+
+assert list(BatterySnapshot._fields) == ANALYSIS_RESULTS_FIELDS, "Fields must follow ANALYSIS_RESULTS_FIELDS."
+
+_fields_getter = itemgetter(*BatterySnapshot._fields)
@@ -1 +1,2 @@
-from .battery_processor import BatteryProcessor
\ No newline at end of file
+from .battery_processor import BatteryProcessor
+from .pool import WorkerPool, get_worker_pool
\ No newline at end of file
@@ -1,10 +1,46 @@
 import shutil
 import tempfile
 import zipfile
-from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, Future, as_completed
 from pathlib import Path
+from typing import Iterator
 
+from src.analysis.parser import init_worker, worker_parser
 from src.config import INSTANCE_PATH, TXT_PATH
+from src.persistence import BatterySnapshot
+
+TEMP_PATH = INSTANCE_PATH / "temp"
+
+
+def find_member(zf: zipfile.ZipFile, step: int) -> str | None:
+    """
+    Find the bugreport member of an opened zip file.
+
+    Parameters
+    ----------
+    zf: zipfile.ZipFile
+        An opened zip file.
+    step: 0 or 1
+        0 -> find inner zip, 1 -> find txt
+
+    Raises
+    ------
+    ValueError
+        Invalid step count.
+
+    Returns
+    -------
+    str | None
+        Member name if found, None otherwise.
+    """
+    if step not in (0, 1):
+        raise ValueError("Invalid step count. It must be 0 or 1.")
+
+    for name in zf.namelist():
+        if name.startswith("bugreport") and name.endswith((".zip", ".txt")[step]):
+            return name
+
+    return None
 
 
 def decompress(source: str | Path, target: str | Path, step: int) -> str | None:
@@ -32,75 +68,139 @@ def decompress(source: str | Path, target: str | Path, step: int) -> str | None:
     str | None
         Filename if found, None otherwise.
     """
-    if step not in (0, 1):
-        raise ValueError("Invalid step count. It must be 0 or 1.")
-
     with zipfile.ZipFile(file=source, mode="r") as zf:
-        for name in zf.namelist():
-            if name.startswith("bugreport") and name.endswith((".zip", ".txt")[step]):
-                zf.extract(name, target)
-                return name
+        name = find_member(zf=zf, step=step)
+        if name is not None:
+            zf.extract(name, target)
 
-    return None
+    return name
 
 
-class BatteryProcessor:
-    def __init__(self) -> None:
-        self.top_temp = INSTANCE_PATH / "temp"
+def check_zip_path(fp: str | Path) -> Path:
+    """
+    Check that the given path is an existing Xiaomi zip file.
 
-        if self.top_temp.exists():
-            shutil.rmtree(self.top_temp, ignore_errors=True)
+    Raises
+    ------
+    ValueError
+        Not a valid file, or not a Xiaomi zip file.
+    """
+    path = Path(fp)
 
-        self.top_temp.mkdir(exist_ok=True)
+    if not path.is_file():
+        raise ValueError(f"Variable '{fp}' is not a valid file.")
 
-        self.final_path = TXT_PATH
-        self.final_path.mkdir(exist_ok=True)
+    if not path.stem.startswith("bugreport") or path.suffix != ".zip":
+        raise ValueError(f"'{path.name}' not a valid Xiaomi zip file.")
 
-    def _extract_single_log(self, fp: str | Path) -> Path:
-        """
-        Extract a Xiaomi log file from a specified Xiaomi zip file.
+    return path
 
-        Parameters
-        ----------
-        fp: str or Path
-            Path of Xiaomi zip file.
 
-        Returns
-        -------
-        Path
-            A Path object containing the Xiaomi log filepath.
-        """
-        path = Path(fp)
+def extract_log(fp: str | Path, temp_root: str | Path = TEMP_PATH, target: str | Path = TXT_PATH) -> Path:
+    """
+    Extract a Xiaomi log file from a specified Xiaomi zip file.
 
-        if not path.is_file():
-            raise ValueError(f"Variable '{fp}' is not a valid file.")
+    Parameters
+    ----------
+    fp: str or Path
+        Path of Xiaomi zip file.
+    temp_root: str or Path
+        Directory in which temporary directories are created.
+    target: str or Path
+        Directory the log file is copied to.
 
-        if not path.stem.startswith("bugreport") or path.suffix != ".zip":
-            raise ValueError(f"'{path.name}' not a valid Xiaomi zip file.")
+    Returns
+    -------
+    Path
+        A Path object containing the Xiaomi log filepath.
+    """
+    path = check_zip_path(fp=fp)
+    target = Path(target)
 
-        with tempfile.TemporaryDirectory(dir=self.top_temp, prefix="temp-") as td:
-            temp_path = Path(td)
+    with tempfile.TemporaryDirectory(dir=temp_root, prefix="temp-") as td:
+        temp_path = Path(td)
 
-            try:
-                current_path = path
-                step = 0
-                while step <= 1:
-                    decompress_name = decompress(source=current_path, target=temp_path, step=step)
-                    if decompress_name is None:
-                        raise ValueError(f"Step {step}: No matching file found in {current_path}")
+        try:
+            current_path = path
+            step = 0
+            while step <= 1:
+                decompress_name = decompress(source=current_path, target=temp_path, step=step)
+                if decompress_name is None:
+                    raise ValueError(f"Step {step}: No matching file found in {current_path}")
 
-                    current_path = temp_path / decompress_name
-                    step += 1
+                current_path = temp_path / decompress_name
+                step += 1
 
-                shutil.copy2(src=current_path, dst=self.final_path)
-                return self.final_path / decompress_name
+            shutil.copy2(src=current_path, dst=target)
+            return target / decompress_name
 
-            except Exception as e:
-                raise RuntimeError(f"Failed to process {path.name}: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to process {path.name}: {e}")
+
+
+def parse_log(fp: str | Path, keep_txt: bool = False) -> tuple | None:
+    """
+    Parse a Xiaomi log file straight from a specified Xiaomi zip file, without extracting it to disk.
+    The inner zip and the txt are opened as streams and the decompressed bytes are fed into the parser.
+
+    This is the worker entry point of the processing pool, so only the path is pickled for each task.
+    The record is sent back as a plain tuple, which pickles faster than the named tuple, see `BatterySnapshot`.
+
+    Parameters
+    ----------
+    fp: str or Path
+        Path of Xiaomi zip file.
+    keep_txt: bool
+        If True, the txt file is extracted into `TXT_PATH` first and parsed from there.
+
+    Returns
+    -------
+    tuple or None
+        Fields of the `BatterySnapshot` of the battery information, or None if any field is missing.
+    """
+    path = check_zip_path(fp=fp)
+    parser = worker_parser()
+
+    if keep_txt:
+        record = parser._parse_info(path=extract_log(fp=path))  # noqa
+        return tuple(record) if record is not None else None
+
+    try:
+        with zipfile.ZipFile(file=path, mode="r") as outer_zf:
+            inner_name = find_member(zf=outer_zf, step=0)
+            if inner_name is None:
+                raise ValueError(f"Step 0: No matching file found in {path}")
+
+            with outer_zf.open(inner_name) as inner_file, zipfile.ZipFile(file=inner_file, mode="r") as inner_zf:
+                txt_name = find_member(zf=inner_zf, step=1)
+                if txt_name is None:
+                    raise ValueError(f"Step 1: No matching file found in {inner_name}")
+
+                with inner_zf.open(txt_name) as stream:
+                    record = parser.parse_stream(stream=stream)
+
+        return tuple(record) if record is not None else None
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to process {path.name}: {e}")
+
+
+class BatteryProcessor:
+    def __init__(self) -> None:
+        self.top_temp = TEMP_PATH
+
+        if self.top_temp.exists():
+            shutil.rmtree(self.top_temp, ignore_errors=True)
+
+        self.top_temp.mkdir(exist_ok=True)
+
+        self.final_path = TXT_PATH
+        self.final_path.mkdir(exist_ok=True)
 
     def process_xiaomi_log(self, fps: list[str | Path], thread_count: int) -> list[Path]:
         """
         Process or extract one or more Xiaomi log files from zip files.
+        Archives that cannot be extracted are left out.
 
         Parameters
         ----------
@@ -109,6 +209,11 @@ class BatteryProcessor:
         thread_count: int
             Number of worker threads/processes.
 
+        Raises
+        ------
+        BrokenExecutor
+            If the worker pool broke down, e.g. a worker process could not be started.
+
         Returns
         -------
         list[Path]
@@ -128,19 +233,127 @@ class BatteryProcessor:
         workers = min(len(fps), thread_count)
 
         with ProcessPoolExecutor(max_workers=workers) as executor:
-            futures: list[Future[Path]] = [executor.submit(self._extract_single_log, file) for file in fps]
+            futures: list[Future[Path]] = [
+                executor.submit(extract_log, file, self.top_temp, self.final_path) for file in fps
+            ]
 
             for future in futures:
                 try:
                     results = future.result()
-                    if results:
-                        final_paths.append(Path(results))
-                except Exception as e:
-                    print(e)
+                except BrokenExecutor:
+                    raise
+                except Exception:
                     continue
 
+                if results:
+                    final_paths.append(Path(results))
+
         return final_paths
 
+    @staticmethod
+    def _iter_futures(
+            executor: Executor,
+            fps: list[str | Path],
+            keep_txt: bool
+    ) -> Iterator[tuple[Path, BatterySnapshot | Exception | None]]:
+        futures: dict[Future[tuple | None], Path] = {
+            executor.submit(parse_log, file, keep_txt): Path(file) for file in fps
+        }
+
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except BrokenExecutor:
+                # Every pending archive would fail the same way.
+                raise
+            except Exception as e:
+                results = e
+            else:
+                if results is not None:
+                    results = BatterySnapshot._make(results)
+
+            yield futures[future], results
+
+    def iter_xiaomi_log(
+            self,
+            fps: list[str | Path],
+            thread_count: int,
+            keep_txt: bool = False,
+            executor: Executor | None = None
+    ) -> Iterator[tuple[Path, BatterySnapshot | Exception | None]]:
+        """
+        Extract and parse one or more Xiaomi zip files in a single worker pool, yielding each result as soon as it completes.
+
+        Parameters
+        ----------
+        fps: list[str | Path]
+            A list of Xiaomi zip file paths.
+        thread_count: int
+            Number of worker threads/processes.
+        keep_txt: bool
+            If True, the extracted txt files are kept in `TXT_PATH`.
+        executor: Executor or None
+            A running executor to submit tasks to, e.g. a warm `WorkerPool`. It is not shut down afterward.
+            If None, a new process pool of `thread_count` workers is used.
+
+        Raises
+        ------
+        BrokenExecutor
+            If the worker pool broke down, e.g. a worker process could not be started.
+
+        Yields
+        ------
+        tuple[Path, BatterySnapshot | Exception | None]
+            The zip file path and its battery information, None if a field is missing,
+            or the exception raised while extracting or parsing the archive.
+        """
+        if not isinstance(fps, list):
+            raise TypeError(f"Variable 'fps' must be a list, not '{type(fps).__name__}'.")
+
+        if not fps:
+            return
+
+        if thread_count < 1:
+            raise ValueError(f"Thread count must be greater than 0, current value: {thread_count}")
+
+        if executor is not None:
+            yield from self._iter_futures(executor=executor, fps=fps, keep_txt=keep_txt)
+            return
+
+        workers = min(len(fps), thread_count)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            yield from self._iter_futures(executor=executor, fps=fps, keep_txt=keep_txt)
+
+    def parse_xiaomi_log(
+            self,
+            fps: list[str | Path],
+            thread_count: int,
+            keep_txt: bool = False
+    ) -> dict[Path, BatterySnapshot]:
+        """
+        Parse battery information from one or more Xiaomi zip files, extracting and parsing each archive end-to-end.
+        Archives that cannot be parsed are left out.
+
+        Parameters
+        ----------
+        fps: list[str | Path]
+            A list of Xiaomi zip file paths.
+        thread_count: int
+            Number of worker threads/processes.
+        keep_txt: bool
+            If True, the extracted txt files are kept in `TXT_PATH`.
+
+        Returns
+        -------
+        dict[Path, BatterySnapshot]
+            Battery information keyed by the zip file it was parsed from.
+        """
+        return {
+            path: results
+            for path, results in self.iter_xiaomi_log(fps=fps, thread_count=thread_count, keep_txt=keep_txt)
+            if isinstance(results, BatterySnapshot)
+        }
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,122 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.analysis.parser import init_worker
+
+# Seconds without any user before the warm worker processes are shut down.
+IDLE_TIMEOUT = 300
+
+
+class WorkerPool:
+    """
+    A long-lived, lazily started process pool shared by every pipeline run of the current process.
+    Workers keep their imports and compiled patterns between runs, and are shut down after `idle_timeout` seconds
+    without any user.
+    """
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.idle_timeout = idle_timeout
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._workers = 0
+        self._users = 0
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+
+        # Forking a multithreaded web server is unsafe, so workers are started from a fork server (or spawned).
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._mp_context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # The fork server preloads `__main__` by default, i.e. the whole web app. Workers only need the parser.
+            self._mp_context.set_forkserver_preload(["src.analysis.parser"])
+
+    def _shutdown_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._workers = 0
+
+    def _on_idle(self) -> None:
+        with self._lock:
+            if self._users == 0:
+                self._shutdown_executor()
+
+    def acquire(self, workers: int) -> ProcessPoolExecutor:
+        """
+        Get the warm executor, starting it if needed. Every call must be paired with `release`.
+
+        Parameters
+        ----------
+        workers: int
+            Number of worker processes. A different size only takes effect when the pool is not in use.
+
+        Returns
+        -------
+        ProcessPoolExecutor
+            The shared executor.
+        """
+        if workers < 1:
+            raise ValueError(f"Worker count must be greater than 0, current value: {workers}")
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            broken = self._executor is not None and self._executor._broken  # noqa
+            if self._users == 0 and (broken or self._workers != workers):
+                self._shutdown_executor()
+
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=self._mp_context, initializer=init_worker
+                )
+                self._workers = workers
+
+            self._users += 1
+            return self._executor
+
+    def release(self) -> None:
+        """
+        Give back the executor got from `acquire`. The idle timer starts when the last user releases it.
+        """
+        with self._lock:
+            self._users = max(self._users - 1, 0)
+            if self._users == 0 and self._executor is not None:
+                self._timer = threading.Timer(self.idle_timeout, self._on_idle)
+                self._timer.daemon = True
+                self._timer.start()
+
+    @contextmanager
+    def lease(self, workers: int) -> Iterator[ProcessPoolExecutor]:
+        executor = self.acquire(workers=workers)
+        try:
+            yield executor
+        finally:
+            self.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            self._shutdown_executor()
+
+
+_worker_pool: WorkerPool | None = None
+
+
+def get_worker_pool() -> WorkerPool:
+    """
+    Get the worker pool of the current process, creating it on first use.
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = WorkerPool()
+        atexit.register(_worker_pool.shutdown)
+
+    return _worker_pool
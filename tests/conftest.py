@@ -0,0 +1,17 @@
+import pytest
+
+from src.persistence import connect
+from src.persistence.connect import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch) -> ConnectionPool:
+    """
+    A migrated database in a temporary directory, used by every storage class instead of the one in `instance`.
+    """
+    pool = ConnectionPool(tmp_path / "database.db")
+    pool.migrate()
+    monkeypatch.setattr(connect, "_connection_pool", pool)
+
+    yield pool
+    pool.close()
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from src.analysis import DataServices
+from src.persistence import AnalysisResults, BatterySnapshot
+
+
+def snapshots(count: int, start: int = 0) -> list[BatterySnapshot]:
+    return [
+        BatterySnapshot("Xiaomi", f"model-{i % 2}", "OS2.0", 5000, 1700000000 + i * 3600, i, 4800, 4700, 4600, 4900, 4750)
+        for i in range(start, start + count)
+    ]
+
+
+def committed(pool) -> tuple[int, int]:
+    """
+    Row count and data generation as seen by a separate connection, i.e. what is committed.
+    """
+    with sqlite3.connect(pool.path) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0]
+        row = conn.execute("SELECT generation FROM data_generation WHERE table_name = 'analysis_results'").fetchone()
+
+    return rows, row[0] if row else 0
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_init_data_commits_generation_with_rows(pool, bulk):
+    services = DataServices()
+    services.init_data(table="analysis_results", data=snapshots(10), bulk=bulk)
+    rows, generation = committed(pool)
+
+    services.append_data(table="analysis_results", data=snapshots(5, start=10))
+
+    assert rows == 10 and generation > 0
+    assert committed(pool) == (15, generation + 1)
+
+
+def test_rolled_back_write_keeps_generation(pool):
+    storage = AnalysisResults()
+    storage.save_data(data=snapshots(10))
+    before = committed(pool)
+    assert before == (10, 1)
+
+    with pytest.raises(RuntimeError):
+        with storage.writer():
+            storage.save_data(data=snapshots(5, start=10))
+            raise RuntimeError
+
+    assert committed(pool) == before
+    assert storage.get_generation() == before[1]
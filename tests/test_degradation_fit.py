@@ -0,0 +1,27 @@
+import math
+
+from src.analysis import DataServices
+from src.persistence import BatterySnapshot
+
+
+def captures(model: str, cycle_counts: list[int]) -> list[BatterySnapshot]:
+    return [
+        BatterySnapshot("Xiaomi", model, "OS2.0", 5000, 1700000000 + i * 86400, cycles, 4800 - i * 10, 4700, 4600, 4500, 4750)
+        for i, cycles in enumerate(cycle_counts)
+    ]
+
+
+def test_fleet_stats_and_projection_agree_on_equal_cycle_counts(pool):
+    services = DataServices()
+    # Equal cycle counts large enough for the float products of their sums not to cancel out exactly.
+    services.init_data(
+        table="analysis_results",
+        data=captures(model="flat", cycle_counts=[61_613_159] * 6) + captures(model="fading", cycle_counts=[0, 100, 200, 300])
+    )
+
+    stats = services.get_fleet_stats().set_index("nickname")
+    flat = services.get_degradation_projection(model="flat")
+    fading = services.get_degradation_projection(model="fading")
+
+    assert math.isnan(stats.loc["flat", "degradation"]) and flat["capacity_per_100_cycles"] is None
+    assert stats.loc["fading", "degradation"] == fading["capacity_per_100_cycles"] == -10
@@ -0,0 +1,35 @@
+from src.persistence import BatterySnapshot, ParseCache
+from utils.pipelines import _lookup_cache  # noqa
+
+RECORD = BatterySnapshot("Xiaomi", "fuxi", "OS2.0", 5000, 1700000000, 100, 4800, 4700, 4600, 4900, 4750)
+
+
+def archive(tmp_path, name: str, content: bytes) -> tuple:
+    path = tmp_path / name
+    path.write_bytes(content)
+    stat = path.stat()
+    return path, (ParseCache.file_digest(path=path), path.name, stat.st_size, stat.st_mtime_ns)
+
+
+def test_archives_without_battery_information_are_cached(pool, tmp_path):
+    cache = ParseCache()
+    parsed, parsed_key = archive(tmp_path, name="bugreport-a.zip", content=b"a")
+    empty, empty_key = archive(tmp_path, name="bugreport-b.zip", content=b"b")
+    new, new_key = archive(tmp_path, name="bugreport-c.zip", content=b"c")
+
+    cache.save_data(data=[(*parsed_key, RECORD), (*empty_key, None)])
+
+    assert cache.get_by_stat(*parsed_key[1:]) == (True, RECORD)
+    assert cache.get_by_stat(*empty_key[1:]) == (True, None)
+    assert cache.get_by_stat(*new_key[1:]) == (False, None)
+    assert _lookup_cache(cache=cache, zips=[parsed, empty, new]) == ([RECORD], {new: new_key})
+
+
+def test_renamed_archive_without_battery_information_is_found_by_hash(pool, tmp_path):
+    cache = ParseCache()
+    _, key = archive(tmp_path, name="bugreport-a.zip", content=b"a")
+    cache.save_data(data=[(*key, None)])
+    renamed, renamed_key = archive(tmp_path, name="bugreport-renamed.zip", content=b"a")
+
+    assert _lookup_cache(cache=cache, zips=[renamed]) == ([], {})
+    assert cache.get_by_stat(*renamed_key[1:]) == (True, None)
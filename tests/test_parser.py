@@ -0,0 +1,35 @@
+import io
+import logging
+
+import pytest
+
+from benchmarks.synthetic import write_bugreport
+from src.analysis.parser import Parser
+
+
+@pytest.fixture(scope="module")
+def report(tmp_path_factory) -> bytes:
+    return write_bugreport(path=tmp_path_factory.mktemp("parser") / "bugreport-fuxi.txt", size_mb=0).read_bytes()
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n"], ids=["lf", "crlf"])
+def test_line_endings(tmp_path, report, newline):
+    content = report.replace(b"\n", newline)
+    path = tmp_path / "bugreport-fuxi.txt"
+    path.write_bytes(content)
+    parser = Parser()
+
+    record = parser.parse_stream(stream=io.BytesIO(content))
+
+    # Both scanners find the same fields as in the report with LF line endings.
+    assert record is not None and record == parser.parse_stream(stream=io.BytesIO(report))
+    assert parser._parse_info(path=path) == record  # noqa
+
+
+def test_failed_files_are_logged(tmp_path, caplog):
+    missing = tmp_path / "bugreport-missing.txt"
+
+    with caplog.at_level(logging.ERROR, logger="src.analysis.parser"):
+        assert Parser().parser(tps=[missing], thread_count=1) == []
+
+    assert str(missing) in caplog.text
@@ -0,0 +1,101 @@
+import sqlite3
+from collections.abc import Callable
+
+import pytest
+
+from src.persistence import AnalysisResults, BatterySnapshot
+from src.persistence.model_summary import refresh_model_summary
+
+MODEL_INDEX = "idx_uni_model_log"
+
+
+@pytest.fixture
+def results(pool) -> AnalysisResults:
+    storage = AnalysisResults()
+    storage.save_data(data=[
+        BatterySnapshot("Xiaomi", f"model-{i % 2}", "OS2.0", 5000, 1700000000 + i * 3600, i, 4800, 4700, 4600, 4900, 4750)
+        for i in range(20)
+    ])
+    return storage
+
+
+def trace(conn: sqlite3.Connection, call: Callable[[], object]) -> list[str]:
+    """
+    Run `call` and get the SELECT statements it ran on `conn`, with their parameters bound.
+    """
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+
+    return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+
+def query_plan(conn: sqlite3.Connection, statement: str) -> list[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+
+
+def assert_model_reads(conn: sqlite3.Connection, statements: list[str], ordered: bool = True) -> None:
+    """
+    Every read of analysis_results must search the model-leading index, and never scan the table.
+    """
+    reads = [statement for statement in statements if "analysis_results" in statement]
+    assert reads
+
+    for statement in reads:
+        plan = query_plan(conn=conn, statement=statement)
+        steps = [step for step in plan if step.startswith(("SEARCH", "SCAN")) and " models " not in f"{step} "]
+        results_steps = [step for step in steps if step.split()[1] in ("analysis_results", "r")]
+
+        assert results_steps, plan
+        for step in results_steps:
+            assert step.startswith("SEARCH") and f"INDEX {MODEL_INDEX} (model_id=?" in step, (statement, plan)
+
+        if ordered:
+            assert "USE TEMP B-TREE FOR ORDER BY" not in plan, (statement, plan)
+
+
+def test_get_results_uses_model_index(results):
+    statements = trace(conn=results.conn, call=lambda: results.get_results(model="model-0"))
+    assert_model_reads(conn=results.conn, statements=statements)
+
+
+def test_get_results_frame_uses_model_index(results):
+    statements = trace(
+        conn=results.conn,
+        call=lambda: results.get_results_frame(model="model-0", columns=["log_capture_time", "hardware_capacity"])
+    )
+    assert_model_reads(conn=results.conn, statements=statements)
+
+
+def test_get_results_page_uses_model_index(results):
+    def read_pages() -> None:
+        results.get_results_page(model="model-0", limit=5)
+        results.get_results_page(model="model-0", after=(1700000000 + 10 * 3600, 11), limit=5)
+
+    statements = trace(conn=results.conn, call=read_pages)
+    assert_model_reads(conn=results.conn, statements=statements)
+
+
+def test_get_results_page_by_other_column_only_searches_model(results):
+    statements = trace(conn=results.conn, call=lambda: results.get_results_page(model="model-0", sort_by="cycle_count"))
+    assert_model_reads(conn=results.conn, statements=statements, ordered=False)
+
+
+def test_count_results_uses_covering_model_index(results):
+    statements = trace(conn=results.conn, call=lambda: results.count_results(model="model-0"))
+    assert_model_reads(conn=results.conn, statements=statements)
+
+    plan = query_plan(conn=results.conn, statement=statements[-1])
+    assert f"SEARCH analysis_results USING COVERING INDEX {MODEL_INDEX} (model_id=?)" in plan
+
+
+def test_model_summary_refresh_uses_model_index(results, pool):
+    def refresh() -> None:
+        with pool.writer() as conn:
+            refresh_model_summary(cur=conn.cursor(), nicknames=["model-0"])
+
+    statements = trace(conn=pool._writer_connection(), call=refresh)  # noqa
+    assert_model_reads(conn=results.conn, statements=statements, ordered=False)
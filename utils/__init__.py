@@ -1,2 +1,2 @@
-from .pipelines import analysis_pipeline
+from .pipelines import analysis_pipeline, pipeline_runner
 from .ui import format_alert_content
@@ -1,14 +1,23 @@
 import os
 import shutil
+import threading
+import uuid
+from concurrent.futures import BrokenExecutor
+from pathlib import Path
 from typing import Literal, Callable
 
-from src.analysis import DataServices, Parser
+from src.analysis import DataServices
 from src.config import UPLOAD_PATH, TXT_PATH
-from src.processing import BatteryProcessor
+from src.persistence import BatterySnapshot, ParseCache
+from src.processing import BatteryProcessor, get_worker_pool
 
 
-def _calculate_workers(mode: Literal["low", "medium", "high"], file_count: int) -> int:
+def _calculate_workers(mode: Literal["low", "medium", "high"], file_count: int | None = None) -> int:
     cpu_count = os.cpu_count() or 1
+    if file_count is None:
+        # Size of the shared worker pool, which does not depend on a single batch
+        file_count = cpu_count
+
     if mode == "low":
         # Low mode
         return min(max(cpu_count // 2, 1), file_count, 4)
@@ -24,10 +33,62 @@ def _calculate_workers(mode: Literal["low", "medium", "high"], file_count: int)
     raise ValueError(f"Invalid thread mode: {mode}")
 
 
+def _lookup_cache(
+        cache: ParseCache,
+        zips: list[Path]
+) -> tuple[list[BatterySnapshot], dict[Path, tuple[str, str, int, int]]]:
+    """
+    Split zip files into cached results and archives that still need to be parsed.
+    The size and modification time are checked first, the content hash is only calculated on a miss.
+    Cached archives without battery information are in neither of them.
+
+    Parameters
+    ----------
+    cache: ParseCache
+        The parse result cache.
+    zips: list[Path]
+        Zip files to look up.
+
+    Returns
+    -------
+    tuple[list[BatterySnapshot], dict[Path, tuple[str, str, int, int]]]
+        Cached battery information, and the cache keys (file_hash, file_name, file_size, file_mtime) of new archives.
+    """
+    cached_data = []
+    cache_keys = {}
+
+    for path in zips:
+        stat = path.stat()
+        hit, record = cache.get_by_stat(name=path.name, size=stat.st_size, mtime=stat.st_mtime_ns)
+        if not hit:
+            file_hash = cache.file_digest(path=path)
+            hit, record = cache.get_by_hash(
+                file_hash=file_hash, name=path.name, size=stat.st_size, mtime=stat.st_mtime_ns
+            )
+            if not hit:
+                cache_keys[path] = (file_hash, path.name, stat.st_size, stat.st_mtime_ns)
+                continue
+
+        if record is not None:
+            cached_data.append(record)
+
+    return cached_data, cache_keys
+
+
+def _describe_failures(failures: dict[Path, Exception], limit: int = 5) -> str:
+    # The exceptions raised by `parse_log` already name their archive.
+    described = "; ".join(str(e) for e in list(failures.values())[:limit])
+    if len(failures) > limit:
+        described += f"; and {len(failures) - limit} more"
+
+    return f"{len(failures)} Zip files could not be parsed: {described}."
+
+
 def analysis_pipeline(
         mode: Literal["init", "append"],
         thread: Literal["low", "medium", "high"],
         set_progress: Callable | None = None,
+        keep_txt: bool = False,
 ) -> dict[str, str]:
     if mode not in ("init", "append"):
         raise ValueError(f"Invalid operation mode: {mode}")
@@ -35,36 +96,86 @@ def analysis_pipeline(
     shutil.rmtree(TXT_PATH, ignore_errors=True)
     TXT_PATH.mkdir(parents=True, exist_ok=True)
 
-    # Stage 1: Extraction
-    if set_progress:
-        set_progress(("10", "Phase 1/3: Extracting Zip files..."))
-
     zips = list(UPLOAD_PATH.glob("*.zip"))
     if not zips:
         return {"status": "error", "message": "No zip files found."}
 
-    processor = BatteryProcessor()
-    process_workers = _calculate_workers(mode=thread, file_count=len(zips))
-    txt_paths = processor.process_xiaomi_log(fps=zips, thread_count=process_workers)
-    if not txt_paths:
-        return {"status": "error", "message": "Extraction failed. No valid log files extracted."}
+    # Stage 1: Looking up archives that were parsed before
+    if set_progress:
+        set_progress(("5", f"Phase 1/3: Checking {len(zips)} Zip files against the cache..."))
+
+    cache = ParseCache()
+    if keep_txt:
+        # Txt files are only written while parsing, so every archive is parsed again, and the cache is left as it is.
+        cached_data, cache_keys = [], {}
+        new_zips = zips
+    else:
+        cached_data, cache_keys = _lookup_cache(cache=cache, zips=zips)
+        new_zips = list(cache_keys.keys())
 
-    # Stage 2: Parsing Data
+    # Stage 2: Parsing Data straight from Zip files
     if set_progress:
-        set_progress(("40", f"Phase 2/3: Parsing {len(txt_paths)} logs..."))
+        set_progress(("10", f"Phase 2/3: Parsing {len(new_zips)} new Zip files ({len(cached_data)} cached)..."))
+
+    parsed_info = {}
+    empty = []
+    failures = {}
+    if new_zips:
+        processor = BatteryProcessor()
+        pool_workers = _calculate_workers(mode=thread)
+
+        try:
+            with get_worker_pool().lease(workers=pool_workers) as executor:
+                results = processor.iter_xiaomi_log(
+                    fps=new_zips, thread_count=pool_workers, keep_txt=keep_txt, executor=executor
+                )
+
+                for done, (path, record) in enumerate(results, start=1):
+                    if isinstance(record, Exception):
+                        failures[path] = record
+                    elif record:
+                        parsed_info[path] = record
+                    else:
+                        empty.append(path)
+
+                    if set_progress:
+                        percent = 10 + done * 70 // len(new_zips)
+                        message = f"Phase 2/3: Parsed {done}/{len(new_zips)} new Zip files ({path.name})..."
+                        set_progress((str(percent), message))
+        except BrokenExecutor as e:
+            # The pool is replaced on the next run.
+            return {"status": "error", "message": f"The worker processes failed, no Zip file could be parsed: {e}"}
+
+        # Archives without battery information are cached too, they would only be parsed to nothing again.
+        # Failed archives are not, the failure may not be the archive's, e.g. a file still being written.
+        if cache_keys:
+            cache.save_data(data=[(*cache_keys[path], parsed_info.get(path)) for path in [*parsed_info, *empty]])
+
+    ds = DataServices()
+
+    if mode == "append":
+        # Cached archives were usually stored by an earlier run, only the ones missing from the table are saved again.
+        parsed_data = ds.get_unsaved_data("analysis_results", cached_data) + list(parsed_info.values())
+    else:
+        parsed_data = cached_data + list(parsed_info.values())
 
-    parser = Parser()
-    parse_workers = _calculate_workers(mode=thread, file_count=len(txt_paths))
-    parsed_data = parser.parser(tps=txt_paths, thread_count=parse_workers)
     if not parsed_data:
-        return {"status": "error", "message": "Parsing failed. No valid battery data found in logs."}
+        if mode == "append" and cached_data:
+            return {
+                "status": "success",
+                "message": f"No new records to append, all {len(cached_data)} Zip files were processed before."
+            }
+
+        message = "Parsing failed. No valid battery data found in logs."
+        if failures:
+            message += " " + _describe_failures(failures=failures)
+
+        return {"status": "error", "message": message}
 
     # Stage 3: Storing Data
     if set_progress:
         set_progress(("80", f"Phase 3/3: Saving {len(parsed_data)} records..."))
 
-    ds = DataServices()
-
     if mode == "append":
         count = ds.append_data("analysis_results", parsed_data)
     else:
@@ -73,7 +184,112 @@ def analysis_pipeline(
     if set_progress:
         set_progress(("100", "Done!"))
 
-    return {
-        "status": "success",
-        "message": f"Successfully processed {count} records in '{mode}' mode."
-    }
+    message = f"Successfully processed {count} records in '{mode}' mode ({len(cached_data)} reused from cache)."
+    if mode == "init" and ds.last_ingest_rate:
+        message += f" Loaded at {ds.last_ingest_rate:,.0f} records/s."
+    if failures:
+        return {"status": "warning", "message": message + " " + _describe_failures(failures=failures)}
+
+    return {"status": "success", "message": message}
+
+
+class PipelineRun:
+    """
+    Progress and outcome of one pipeline run.
+    """
+    def __init__(self, run_id: str) -> None:
+        self.run_id = run_id
+        self.progress: tuple[str, str] = ("0", "Initializing...")
+        self.results: dict[str, str] | None = None
+        self.error: Exception | None = None
+        self.thread: threading.Thread | None = None
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+class PipelineRunner:
+    """
+    Run `analysis_pipeline` in a background thread of the server process.
+    Running inside the long-lived server process lets every run reuse the warm worker pool.
+
+    Runs share the worker pool, the extraction folders and the database, so only one run at a time is allowed
+    per server. Each run has its own id: the browser session that started it keeps the id, and is the only one
+    to see the progress and result of the run.
+    """
+    def __init__(self, max_finished: int = 16) -> None:
+        self.max_finished = max_finished
+
+        self._runs: dict[str, PipelineRun] = {}
+        self._current: PipelineRun | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _run(run: PipelineRun, **kwargs) -> None:
+        def set_progress(progress: tuple[str, str]) -> None:
+            run.progress = progress
+
+        try:
+            run.results = analysis_pipeline(set_progress=set_progress, **kwargs)
+        except Exception as e:
+            run.error = e
+
+    def is_running(self) -> bool:
+        """
+        Whether a run of any session is in progress.
+        """
+        return self._current is not None and self._current.is_running()
+
+    def get_run(self, run_id: str | None) -> PipelineRun | None:
+        """
+        Get a run by its id, None if it is unknown or was discarded.
+        """
+        return self._runs.get(run_id) if run_id else None
+
+    def discard(self, run_id: str) -> None:
+        """
+        Forget a finished run once its session has shown the result.
+        """
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None and not run.is_running():
+                del self._runs[run_id]
+
+    def start(
+            self,
+            mode: Literal["init", "append"],
+            thread: Literal["low", "medium", "high"],
+            keep_txt: bool = False,
+    ) -> str | None:
+        """
+        Start a pipeline run in the background.
+
+        Returns
+        -------
+        str or None
+            The id of the new run, or None if another run is still in progress.
+        """
+        with self._lock:
+            if self.is_running():
+                return None
+
+            # Results never collected by their session, e.g. a closed tab, are dropped oldest first.
+            finished = [run_id for run_id, run in self._runs.items() if not run.is_running()]
+            for run_id in finished[:max(len(finished) - self.max_finished + 1, 0)]:
+                del self._runs[run_id]
+
+            run = PipelineRun(run_id=uuid.uuid4().hex)
+            run.thread = threading.Thread(
+                target=self._run,
+                kwargs={"run": run, "mode": mode, "thread": thread, "keep_txt": keep_txt},
+                name="analysis-pipeline",
+                daemon=True,
+            )
+
+            self._runs[run.run_id] = run
+            self._current = run
+            run.thread.start()
+            return run.run_id
+
+
+pipeline_runner = PipelineRunner()
\ No newline at end of file